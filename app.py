@@ -6,22 +6,26 @@ sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 import re
 import streamlit as st
 import os
-import base64
 from datetime import datetime, timedelta
 import time
+import logging
+from dataclasses import asdict, dataclass, is_dataclass
 from dotenv import load_dotenv
-from crewai import Crew, Agent, Task, Process,LLM
-from crewai_tools import ScrapeWebsiteTool, SerperDevTool
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 from textwrap import dedent
-import pandas as pd
-import plotly.express as px
-from tools.flightAgent import FlightsFinderTool
-from tools.HotelAgent import HotelsFinderTool
-import networkx as nx
-import matplotlib.pyplot as plt
+from tools.scheduler import TaskGraph, TaskEvent
+from tools.workspace import RunWorkspace
+from tools.pool import ObjectPool
+from tools.jobs import JobExecutor
+from tools.airports import airport_codes
+from tools.cache import PlanCache, TTLCache, cache_key
+from tools.singleflight import SingleFlight
+from tools.tracing import Tracer, current_span, record, span
+from tools.prompts import DOCUMENT_RULES, batch_scopes, prompt_report, render as render_prompt
+from tools.validation import validate_document
 
+# Streamlit re-executes this script on every interaction, so crewai and the agent
+# tools are only imported when a plan is generated (see the get_* helpers below)
+# and their instances are built once per process. benchmarks/import_time.py keeps it that way.
 
 load_dotenv()
 
@@ -29,9 +33,73 @@ load_dotenv()
 os.environ["SERPER_API_KEY"] = os.getenv("SERPER_API_KEY")
 os.environ["OPENAI_API_KEY"]=os.getenv("OPENAI_API_KEY")
 
-# Initialize toolss
-search_tool = SerperDevTool()
-scrape_tool = ScrapeWebsiteTool()
+
+@st.cache_resource
+def get_llm():
+    from crewai import LLM
+    from tools.streaming import install_llm_listeners
+    install_llm_listeners()
+    # Agents get this very instance, so its OpenAI client and that client's keep-alive
+    # connection pool are shared by every agent and session in this process.
+    # Tokens are streamed so the result tabs fill in while the agents are still writing
+    return LLM(model="gpt-3.5-turbo-0125", stream=True, timeout=120.0, max_retries=2)
+
+
+@st.cache_resource
+def get_search_tool():
+    from crewai_tools import SerperDevTool
+    from tools.singleflight import coalesced
+
+    class CoalescedSerperDevTool(SerperDevTool):
+        # Agents researching the same destination at once send one query upstream
+        _run = coalesced(SerperDevTool._run)
+
+    return CoalescedSerperDevTool()
+
+
+@st.cache_resource
+def get_flights_tool():
+    from tools.flightAgent import FlightsFinderTool
+    return FlightsFinderTool()
+
+
+@st.cache_resource
+def get_hotels_tool():
+    from tools.HotelAgent import HotelsFinderTool
+    return HotelsFinderTool()
+
+
+@st.cache_resource
+def get_plan_cache():
+    # Flights go stale within hours, a destination guide is good for a week
+    return PlanCache({
+        section: int(os.getenv(f"PLAN_CACHE_TTL_{section.upper()}", ttl))
+        for section, ttl in PLAN_CACHE_TTLS.items()
+    }, max_bytes=int(os.getenv("PLAN_CACHE_MAX_BYTES", 20 * 1024 * 1024)))
+
+
+@st.cache_resource
+def get_destination_store():
+    # What a destination is like barely changes, so a researched guide is reused for a month
+    return TTLCache("destination_knowledge", ttl=int(os.getenv("DESTINATION_KNOWLEDGE_TTL_SECONDS", 30 * 24 * 60 * 60)),
+                    max_bytes=int(os.getenv("DESTINATION_KNOWLEDGE_MAX_BYTES", 20 * 1024 * 1024)))
+
+
+@st.cache_resource
+def get_plan_runs():
+    # Identical plans requested concurrently, from any session, are generated once
+    return SingleFlight()
+
+@st.cache_resource
+def get_job_executor():
+    # Shared by all sessions, so the same trip requested twice runs once
+    return JobExecutor(max_workers=int(os.getenv("PLAN_JOB_WORKERS", 2)))
+
+@st.cache_resource
+def get_agent_pool():
+    # Agents don't depend on the trip, only the tasks do, so agent sets are reused across
+    # runs. Concurrent runs lease separate sets because agents keep per-execution state.
+    return ObjectPool(TravelPlanningCrew.create_agents, max_idle=4)
 
 # Set page config with wider layout and custom theme
 st.set_page_config(
@@ -88,10 +156,75 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Final documents of a plan, each one is the output of the verify task with the same name
+SECTIONS = ("destination_guide", "flight_options", "hotel_recommendations", "itinerary_recommendations")
+
+# Widest flexible date window offered in the sidebar. Same setting as in tools.flightAgent,
+# read here so the sidebar doesn't import crewai before a plan runs
+FLIGHT_FLEX_DAYS_MAX = int(os.getenv("FLIGHT_FLEX_DAYS_MAX", 3))
+
+# Seconds between two reruns of the fragment that follows a running plan job
+JOB_POLL_INTERVAL = 0.5
+
+# Default seconds a finished section is served from the plan cache
+PLAN_CACHE_TTLS = {
+    "destination_guide": 7 * 24 * 60 * 60,
+    "flight_options": 3 * 60 * 60,
+    "hotel_recommendations": 12 * 60 * 60,
+    "itinerary_recommendations": 3 * 24 * 60 * 60,
+}
+
+# Every task that writes (a draft of) a section
+SECTION_BY_TASK = {
+    "destination_research": "destination_guide",
+    "flight_research": "flight_options",
+    "hotel_research": "hotel_recommendations",
+    "itinerary_research": "itinerary_recommendations",
+    "destination_knowledge": "destination_guide",
+    **{section: section for section in SECTIONS},
+}
+
+# Section whose tables and charts show what a search tool returned, by the tool's kind of search
+SECTION_BY_SEARCH = {
+    "flights": "flight_options",
+    "fares": "flight_options",
+    "hotels": "hotel_recommendations",
+}
+
+# Verification tasks and the kind of document each one checks
+VERIFY_TASKS = {
+    "destination_knowledge": "destination_guide",
+    "flight_options": "flight_options",
+    "hotel_recommendations": "hotel_recommendations",
+    "itinerary_recommendations": "itinerary_recommendations",
+}
+
+# validate: deterministic checks, the LLM verifies only the drafts that fail them
+# batched:  one LLM call verifies all drafts together
+# full:     one LLM verification call per draft
+# off:      drafts are used as they are
+VERIFICATION_MODES = ("validate", "batched", "full", "off")
+DEFAULT_VERIFICATION_MODE = os.getenv("VERIFICATION_MODE", "validate")
+
+# Compute the itinerary's day slots from Google Maps attractions before the agent writes it
+PREPLAN_ITINERARY = os.getenv("ITINERARY_PREPLANNER", "1") != "0"
+
+
+def airport_set(value):
+    """Sorted IATA codes of an airport input such as 'HYD, BLR', so the order they're typed in doesn't matter"""
+    return sorted(airport_codes(value))
+
+
+@dataclass
+class SectionOutput:
+    """A document produced without an LLM call, shaped like the ``raw`` of a crewai TaskOutput"""
+    raw: str
+
 class TravelPlanningCrew:
     def __init__(self, destination, departure_airport, arrival_airport, 
                  outbound_date, return_date, 
-                 num_travelers, hotel_city, rooms, adults, children, hotel_class, preferences, budget, special_requirements):
+                 num_travelers, hotel_city, rooms, adults, children, hotel_class, preferences, budget, special_requirements,
+                 persist_outputs=False, verification_mode=DEFAULT_VERIFICATION_MODE, flex_days=0):
         self.destination = destination
         self.departure_airport = departure_airport
         self.arrival_airport = arrival_airport
@@ -106,27 +239,28 @@ class TravelPlanningCrew:
         self.preferences = preferences
         self.budget = budget
         self.special_requirements = special_requirements
-        
-        # Initialize LLM
-        self.llm= ChatOpenAI(model = "gpt-3.5-turbo-0125")
-        # self.llm=LLM(model="openai/gpt-4o-mini",temperature=0.7,api_key=os.environ["OPENAI_API_KEY"])
+        self.flex_days = flex_days
+        if verification_mode not in VERIFICATION_MODES:
+            raise ValueError(f"verification_mode must be one of {', '.join(VERIFICATION_MODES)}")
+        self.verification_mode = verification_mode
+
+        # Spans of this run: tasks, LLM calls, tool calls and searches
+        self.tracer = Tracer()
+        # Rendered task descriptions of the last run, for the prompt token report
+        self.prompts = {}
+        # What the search tools returned in the last run, as rows per section and kind (see SearchRecords)
+        self.search_records = {}
+
+        # Task outputs are passed in memory; writing the final documents to disk is opt-in.
+        # Every persisted run gets its own directory so concurrent sessions don't clobber each other
+        self.workspace = RunWorkspace() if persist_outputs else None
+
+    @staticmethod
+    def create_agents():
+        from crewai import Agent
+        llm = get_llm()
+        search_tool = get_search_tool()
 
-        # Temp file paths for storing unverified content
-        self.temp_output_dir = "temp_outputs"
-        os.makedirs(self.temp_output_dir, exist_ok=True)
-        
-        self.temp_destination_file = f"{self.temp_output_dir}/temp_destination_guide.md"
-        self.temp_flight_file = f"{self.temp_output_dir}/temp_flight_options.md"
-        self.temp_hotel_file = f"{self.temp_output_dir}/temp_hotel_recommendations.md"
-        self.temp_itinerary_file = f"{self.temp_output_dir}/temp_itinerary_recommendations.md"
-
-                # Initialize empty temp files
-        for file_path in [self.temp_destination_file, self.temp_flight_file, 
-                         self.temp_hotel_file, self.temp_itinerary_file]:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write("# Placeholder content\nThis file will be updated by the AI agent.")
-
-    def create_agents(self):
         # Travel Destination Researcher Agent
         destination_researcher = Agent(
             role='Travel Destination Specialist',
@@ -136,8 +270,8 @@ class TravelPlanningCrew:
             Your expertise lies in uncovering hidden gems, understanding local cultures, 
             and providing actionable travel advice that goes beyond typical tourist information.
             You have visited over 100 countries and have written for major travel publications.
-            """),
-            llm=self.llm,
+            """) + DOCUMENT_RULES,
+            llm=llm,
             tools=[search_tool],
             max_iter=5,
             verbose=True,
@@ -154,10 +288,10 @@ class TravelPlanningCrew:
             secure the most comfortable and economical flights for travelers.
             You have 15 years of experience in the airline industry and know how to 
             find the best deals and most comfortable routes.
-            """),
-            llm=self.llm,
+            """) + DOCUMENT_RULES,
+            llm=llm,
             max_iter=3,
-            tools=[FlightsFinderTool()],
+            tools=[get_flights_tool()],
             verbose=True
         )
 
@@ -171,9 +305,9 @@ class TravelPlanningCrew:
             and budget to create the perfect stay experience.
             You've personally stayed in over 500 hotels worldwide and know exactly what makes
             a hotel exceptional for different types of travelers.
-            """),
-            llm=self.llm,
-            tools=[HotelsFinderTool()],
+            """) + DOCUMENT_RULES,
+            llm=llm,
+            tools=[get_hotels_tool()],
             max_iter=3,
             verbose=True
         )
@@ -187,15 +321,25 @@ class TravelPlanningCrew:
             balanced itineraries that match travelers' interests while accounting for practical
             considerations like travel time, budget constraints, and local conditions.
             You have planned over 1,000 successful trips for clients with diverse needs and preferences.
-            """),
-            llm=self.llm,
+            """) + DOCUMENT_RULES,
+            llm=llm,
             tools=[search_tool],
             max_iter=3,
             verbose=True,
             allow_delegation=False
         )
 
-        verification_specialist = Agent(
+        # One verifier per research chain: the chains run concurrently and an
+        # Agent keeps per-execution state, so they must not share an instance.
+        verification_specialists = tuple(TravelPlanningCrew.create_verification_agent(llm) for _ in range(4))
+
+        return (destination_researcher, flight_specialist, hotel_specialist, itinerary_specialist,
+                *verification_specialists)
+
+    @staticmethod
+    def create_verification_agent(llm):
+        from crewai import Agent
+        return Agent(
             role="Travel Content Verification Specialist",
             goal="Verify and enhance travel information while strictly maintaining content category boundaries",
             backstory=dedent("""
@@ -209,399 +353,554 @@ class TravelPlanningCrew:
             you maintain strict boundaries between different content types and NEVER mix destination,
             flight, hotel, and itinerary information. Each document you verify must contain ONLY
             information relevant to its specific category.
-            """),
-            llm=self.llm,
+            """) + DOCUMENT_RULES,
+            llm=llm,
             verbose=True,
             max_iter=3,
             allow_delegation=False
         )
 
-
-
-        return destination_researcher, flight_specialist, hotel_specialist ,itinerary_specialist,verification_specialist
-
-    def create_tasks(self, agents):
-        destination_researcher, flight_specialist, hotel_specialist ,itinerary_specialist,verification_specialist= agents
+    def create_tasks(self, agents, destination_knowledge=None):
+        """Build the trip's tasks; with cached ``destination_knowledge`` the destination chain is one personalization task"""
+        from crewai import Task
+        (destination_researcher, flight_specialist, hotel_specialist, itinerary_specialist,
+         destination_verifier, flight_verifier, hotel_verifier, itinerary_verifier) = agents
         
 
 
         # Destination Research Task
         destination_research_task = Task(
-            description=dedent(f"""
-            Conduct comprehensive research on {self.destination}. 
-            Provide detailed insights including:
-            - Top attractions and must-visit locations with brief descriptions
-            - Best neighborhoods for staying with pros and cons of each
-            - Local culture, customs, and etiquette tips
-            - Transportation options within the destination
-            - Estimated budget recommendations for different spending levels
-            - Seasonal considerations and best time to visit
-            - Safety tips and health recommendations
-            - Local cuisine and must-try dishes
-            
-            Your guide should be visually appealing with clear sections and headers.
-            Include specific recommendations rather than generic advice.
-            
-            RESTRICTIONS:
-            - Verify all information is factually accurate and up-to-date
-            - Avoid generic travel advice that could apply to any destination
-            - Ensure all recommendations are appropriate for the specified number of travelers ({self.num_travelers})
-            - Consider the specified preferences: {self.preferences}
-            - Format the guide in well-structured Markdown with clear headings and subheadings
-            """),
+            name="destination_research",
+            description=self.prompt("destination_research"),
             agent=destination_researcher,
             expected_output="A detailed travel guide with comprehensive destination insights ",
-            output_file=self.temp_destination_file
         )
 
         # Flight Booking Task
         flight_booking_task = Task(
-            description=dedent(f"""
-            Find the best flight options from {self.departure_airport} to {self.arrival_airport}
-            for {self.num_travelers} travelers on the following dates:
-            - Outbound: {self.outbound_date}
-            - Return: {self.return_date}
-            
-            Consider factors like:
-            - Lowest prices and best value (not just the cheapest)
-            - Convenient flight times (avoid very early or late flights)
-            - Minimal layovers and total travel time
-            - Airline reputation and comfort
-            - Baggage allowance policies
-            
-            Present the results in a clean, easy-to-read Markdown table format with these columns:
-            - Airline & Flight Numbers
-            - Departure & Arrival Times (with dates)
-            - Duration (including layovers)
-            - Number of Stops
-            - Price per person
-            - Total price for all travelers
-            - Notable features (baggage policy, meal service, etc.)
-            
-            RESTRICTIONS:
-            - Include at least 3 but no more than 5 flight options
-            - Ensure all prices are reasonably current (note if they are estimates)
-            - Flag any red-eye flights or unusually long layovers
-            - Verify that all flight options can accommodate {self.num_travelers} travelers
-            - Clearly mark the best value option and explain why
-            """),
+            name="flight_research",
+            description=self.prompt("flight_research",
+                                    notes=self.airport_sets_note() + self.flexible_dates_note()),
             agent=flight_specialist,
-            expected_output="A comprehensive list of best flight options with pricing and details ",
-            output_file=self.temp_flight_file
+            expected_output="A short commentary on the flight options found, with the best value pick ",
         )
 
          # Hotel Booking Task
         hotel_booking_task = Task(
-            description=dedent(f"""
-            Find the best hotel options in {self.hotel_city} for the following criteria:
-            - Check-in date: {self.outbound_date}
-            - Check-out date: {self.return_date}
-            - Number of rooms: {self.rooms}
-            - Adults: {self.adults}
-            - Children: {self.children}
-            - Hotel class: {self.hotel_class} stars
-            - Budget level: {self.budget}
-            - Special requirements: {self.special_requirements}
-            
-            Focus your research on:
-            - Location proximity to main attractions and neighborhoods
-            - Value for money within the specified budget level
-            - Amenities that match traveler preferences 
-            - Recent guest reviews and satisfaction ratings
-            - Room types that can accommodate the specified number of travelers
-            - Child-friendly facilities if children are traveling
-            
-            For each hotel, provide:
-            - Name and star rating
-            - Brief description and unique selling points
-            - Location details and nearby attractions
-            - Room types available and recommendations
-            - Key amenities and services
-            - Price range with any special offers
-            - Guest rating summary from multiple sources
-            - Pros and cons based on recent guest reviews
-            
-            RESTRICTIONS:
-            - Recommend exactly 5 hotels that represent different neighborhoods or styles
-            - Verify all hotels are actually available for the specified dates
-            - Ensure all recommended hotels can accommodate the specified number of travelers
-            - Include at least one option that specifically addresses the special requirements
-            - Format information in attractive Markdown with clear sections for each hotel
-            - Clearly indicate which hotel represents the best overall value
-            - Double-check that all prices are within the specified budget level
-            """),
+            name="hotel_research",
+            description=self.prompt("hotel_research"),
             agent=hotel_specialist,
-            expected_output="Top 5 hotel recommendations with detailed descriptions ",
-            output_file=self.temp_hotel_file
+            expected_output="The 3 best hotels found for this party, with why each suits them ",
         )
-     
-                # Calculate the number of days for the itinerary
-        date_format = "%Y-%m-%d"
-        start_date = datetime.strptime(self.outbound_date, date_format)
-        end_date = datetime.strptime(self.return_date, date_format)
-        days = (end_date - start_date).days
 
         # Itinerary Task
         itinerary_task = Task(
-            description=dedent(f"""
-            Create a detailed {days}-day travel itinerary for {self.destination} based on the following parameters:
-            
-            - Traveler preferences: {self.preferences}
-            - Budget level: {self.budget}
-            - Travel dates: {self.outbound_date} to {self.return_date}
-            - Number of travelers: {self.adults} adults and {self.children} children
-            - Special requirements: {self.special_requirements}
-            
-            The itinerary should include:
-            1. A day-by-day breakdown with timestamped activities
-            2. Specific attraction names, not generic recommendations
-            3. Estimated costs for each activity and meal
-            4. Transportation recommendations between locations with options and times
-            5. Restaurant suggestions for each meal with cuisine type and price range
-            6. Alternative activities for bad weather or closures
-            7. Rest periods and downtime, especially for families with children
-            8. A balance of activities that match all stated preferences
-            9. Tips for local etiquette and customs at each location
-            
-            RESTRICTIONS:
-            - Ensure the pace is appropriate for families if children are traveling
-            - Verify all attractions are open on the days they're scheduled
-            - Include at least one activity daily that addresses each stated preference
-            - Don't overpack the schedule - allow reasonable travel time between locations
-            - Ensure all recommended activities fit within the stated budget level
-            - Include specific meeting points and addresses, not just attraction names
-            - Double-check that special requirements are addressed throughout the itinerary
-            - Format the itinerary with clear day headings, timeframes, and sections
-            """),
+            name="itinerary_research",
+            description=self.prompt("itinerary_research"),
             agent=itinerary_specialist,
             expected_output="A comprehensive day-by-day travel itinerary in markdown format with all requested elements.",
-            output_file=self.temp_itinerary_file
         )
 
                # Destination Guide Verification
         verify_destination_task = Task(
-            description=dedent(f"""
-            Perform a thorough verification of the destination guide for {self.destination}.
-            
-            Review the content in {self.temp_destination_file} and check for:
-            1. Factual accuracy of all information
-            2. Completeness of content based on the original requirements
-            3. Relevance to the traveler's preferences: {self.preferences}
-            4. Quality of recommendations and practical usefulness
-            5. Proper formatting and organization
-            6. Any missing critical information about the destination
-
-            IMPORTANT: This document must ONLY contain destination information. 
-            DO NOT include ANY flight details, hotel recommendations, or itinerary schedules.
-            The destination guide should ONLY cover:
-            - Attractions and points of interest
-            - Local culture and customs
-            - Neighborhoods and areas
-            - Transportation within the destination
-            - Safety tips and local information
-                    
-           If you find ANY flight, hotel, or itinerary content in this file, REMOVE IT IMMEDIATELY.
-    
-           If issues are found:
-            - Correct factual errors
-            - Add missing destination information
-            - Improve formatting and structure
-            - Enhance recommendations to better match traveler preferences
-            
-            Create a polished final version that meets all quality standards and ONLY contains destination guide information.
-            """),
-            agent=verification_specialist,
+            name="destination_knowledge",
+            description=self.prompt("destination_knowledge"),
+            agent=destination_verifier,
             expected_output="A verified and enhanced destination guide with ONLY destination information",
-            output_file="destination_guide.md"
+            context=[destination_research_task],
+        )
+
+        # The verified guide is trip independent and cached per destination, each
+        # trip only pays for this personalization pass over it
+        # The cached guide is the task's material, it doesn't count against the prompt's token budget
+        if destination_knowledge:
+            guide_source = "the destination guide below:"
+        else:
+            guide_source = "the destination guide provided as context."
+        personalize_destination_task = Task(
+            name="destination_guide",
+            description=self.prompt("destination_guide", guide_source=guide_source) + (
+                f"\n\n{destination_knowledge}" if destination_knowledge else ""),
+            agent=destination_verifier,
+            expected_output="The destination guide personalized for this trip, ONLY destination information",
+            context=[] if destination_knowledge else [verify_destination_task],
         )
 
         # Flight Options Verification
         verify_flights_task = Task(
-            description=dedent(f"""
-            Verify the flight options presented for the route from {self.departure_airport} to {self.arrival_airport}.
-            
-            Review the content in {self.temp_flight_file} and check for:
-            1. Reasonable pricing and current availability
-            2. Accuracy of flight times and durations
-            3. Completeness of information for each flight option
-            4. Clarity of presentation and formatting
-            5. Appropriateness for {self.num_travelers} travelers
-            6. Proper highlighting of the best value options
-            
-            IMPORTANT: This document must ONLY contain flight information.
-            DO NOT include ANY destination guide content, hotel recommendations, or itinerary schedules.
-            The flight options should ONLY cover:
-            - Airline details and flight numbers
-            - Departure and arrival times
-            - Prices and fees
-            - Layover information
-            - Flight amenities and policies
-            
-            If you find ANY destination, hotel, or itinerary content in this file, REMOVE IT IMMEDIATELY.
-            
-            If issues are found:
-            - Correct any unrealistic prices or flight details
-            - Improve the table formatting for better readability
-            - Ensure all required flight information is included
-            - Add clear recommendations based on traveler needs
-            - Remove any markdown code block indicators
-            
-            Create a polished final version that a traveler could use for booking decisions, containing ONLY flight information.
-            """),
-            agent=verification_specialist,
+            name="flight_options",
+            description=self.prompt("flight_options"),
+            agent=flight_verifier,
             expected_output="Verified and enhanced flight options  with ONLY flight information",
-            output_file="flight_options.md"
+            context=[flight_booking_task],
         )
 
         verify_hotels_task = Task(
-            description=dedent(f"""
-            Verify the hotel recommendations for {self.hotel_city}.
-            
-            Review the content in {self.temp_hotel_file} and check for:
-            1. Accuracy of hotel information and amenities
-            2. Appropriateness for {self.adults} adults and {self.children} children
-            3. Alignment with the requested {self.hotel_class}-star standard
-            4. Suitability for the stated budget level: {self.budget}
-            5. Addressing of special requirements: {self.special_requirements}
-            6. Quality and completeness of the recommendations
-            
-            IMPORTANT: This document must ONLY contain hotel information.
-            DO NOT include ANY destination guide content, flight options, or itinerary schedules.
-            The hotel recommendations should ONLY cover:
-            - Hotel names and ratings
-            - Room types and prices
-            - Hotel locations and amenities
-            - Guest reviews and ratings
-            - Special offers or amenities
-            
-            If you find ANY destination, flight, or itinerary content in this file, REMOVE IT IMMEDIATELY.
-            
-            If issues are found:
-            - Update or correct hotel information
-            - Ensure all hotels can accommodate the specified travelers
-            - Verify price ranges are appropriate for the budget level
-            - Improve formatting and presentation
-            - Add any missing critical details about each property
-            - Remove any markdown code block indicators
-            
-            Create a polished final version with verified, reliable hotel recommendations containing ONLY hotel information.
-            """),
-            agent=verification_specialist,
+            name="hotel_recommendations",
+            description=self.prompt("hotel_recommendations"),
+            agent=hotel_verifier,
             expected_output="Verified and enhanced hotel recommendations  with ONLY hotel information",
-            output_file="hotel_recommendations.md"
+            context=[hotel_booking_task],
     )
         verify_itinerary_task = Task(
-            description=dedent(f"""
-            Verify the {days}-day itinerary for {self.destination}.
-            
-            Review the content in {self.temp_itinerary_file} and check for:
-            1. Logical flow and realistic timing of activities
-            2. Balanced inclusion of all stated preferences: {self.preferences}
-            3. Appropriateness for {self.adults} adults and {self.children} children
-            4. Realistic transportation times between activities
-            5. Accuracy of opening hours and availability
-            6. Alignment with the stated budget level: {self.budget}
-            7. Inclusion of contingency plans and alternatives
-            8. Addressing of special requirements: {self.special_requirements}
-            
-            IMPORTANT: This document must ONLY contain itinerary information.
-            DO NOT include ANY general destination guide content, flight options, or hotel recommendations.
-            The itinerary should ONLY cover:
-            - Day-by-day schedule of activities
-            - Time-specific plans and activities
-            - Recommended restaurants and meals
-            - Transportation between activities
-            - Estimated costs for activities
-            
-            If you find ANY general destination information, flight details, or hotel listings in this file, REMOVE IT IMMEDIATELY.
-            
-            If issues are found:
-            - Adjust timing to be more realistic
-            - Balance activities better across stated preferences
-            - Ensure child-friendly considerations if children are traveling
-            - Add missing details for clarity and usefulness
-            - Improve formatting and day-by-day structure
-            - Remove any markdown code block indicators
-            
-            Create a polished final version that represents a realistic, enjoyable, and well-balanced itinerary containing ONLY day-by-day activity plans.
-            """),
-            agent=verification_specialist,
+            name="itinerary_recommendations",
+            description=self.prompt("itinerary_recommendations"),
+            agent=itinerary_verifier,
             expected_output="A verified and enhanced travel itinerary  with ONLY itinerary information",
-            output_file="itinerary_recommendations.md"
+            context=[itinerary_task],
     )
 
+        destination_tasks = [personalize_destination_task] if destination_knowledge else [
+            destination_research_task, verify_destination_task, personalize_destination_task]
 
-
-        return [destination_research_task,
+        return [*destination_tasks,
                 flight_booking_task,
-                hotel_booking_task,itinerary_task,verify_destination_task,
+                hotel_booking_task,itinerary_task,
                 verify_flights_task,
                 verify_hotels_task,
                 verify_itinerary_task]
 
-    def run(self, progress_bar):
-    # Clear any existing output files to ensure fresh start
-        output_files = {
-            "destination_guide": "destination_guide.md",
-            "flight_options": "flight_options.md",
-            "hotel_recommendations": "hotel_recommendations.md",
-            "itinerary_recommendations": "itinerary_recommendations.md"
-        }
-        
-        for file_path in output_files.values():
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        
-        # Create and run crew
-        agents = self.create_agents()
-        tasks = self.create_tasks(agents)
-        
-        crew = Crew(
-            agents=agents,
-            tasks=tasks,
-            process=Process.sequential,
-            verbose=True
-        )
+    def airport_sets_note(self):
+        if len(airport_set(self.departure_airport)) < 2 and len(airport_set(self.arrival_airport)) < 2:
+            return ""
+        return ("Several airports are acceptable on one or both ends. Pass all of them, comma separated, "
+                "in a single Flights Finder call; it searches every combination and returns one merged list.\n")
 
-        # Simulate progress
-        for i in range(1, 101):
-            progress_bar.progress(i/100)
-            time.sleep(0.05)
-
-        # Run the crew
-        crew.kickoff()
-       
-        # Add small delay to ensure files are written
-        time.sleep(1)
-
-                # Verify final output files exist, if not create with error message
-        for output_name, file_path in output_files.items():
-            if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(f"# {output_name.replace('_', ' ').title()}\n\n")
-                    f.write("Sorry, there was an issue generating this content. ")
-                    f.write("Please try again or adjust your parameters.")
-        
-        return output_files
+    def flexible_dates_note(self):
+        if not self.flex_days:
+            return ""
+        return (f"The travelers can shift both dates by up to {self.flex_days} days. Call the Flights Finder "
+                f"with flex_days={self.flex_days} to get a fare matrix of the nearby dates and point out "
+                f"when other dates are noticeably cheaper.\n")
 
-def display_markdown_file(file_path, default_content=""):
-    """Helper function to display markdown content from a file with retry logic"""
-    max_retries = 3
-    retry_delay = 0.5
-    
-    for attempt in range(max_retries):
+    def fare_matrix(self):
+        """Cheapest fare per date pair around the trip's dates as ``fare_rows``; empty when it can't be searched"""
+        from tools.flightAgent import fare_rows, price_matrix, route_search_params
         try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-                    if content.strip():  # Only return if file has content
-                        return content
-            time.sleep(retry_delay)  # Wait before retrying
+            routes = route_search_params(self.departure_airport, self.arrival_airport, self.outbound_date,
+                                         self.return_date, adults=self.adults, children=self.children)
+            return fare_rows(price_matrix(routes, self.flex_days))
         except Exception as e:
-            st.warning(f"Attempt {attempt + 1} failed for {file_path}: {str(e)}")
-            time.sleep(retry_delay)
-    
-    return default_content
+            logging.warning(f"Fare matrix unavailable: {e}")
+            return []
+
+    def prompt(self, name, task_name=None, **values):
+        """Render the task description ``name`` for this trip and keep its measurements for the report"""
+        rendered = render_prompt(name, **{**vars(self), "days": self.trip_days(), **values})
+        self.prompts[task_name or name] = rendered
+        return rendered.text
+
+    def plan_itinerary_schedule(self):
+        """Deterministic day schedule from Google Maps attractions, None when too few could be placed"""
+        from tools.itinerary import plan_schedule, search_attractions
+        with span("itinerary schedule", "tool") as trace:
+            try:
+                attractions = search_attractions(self.destination, self.preferences)
+            except Exception as e:
+                logging.warning(f"Attraction search failed, the itinerary is planned freely: {e}")
+                attractions = []
+            schedule = plan_schedule(attractions, self.outbound_date, self.return_date, self.children, self.budget)
+            if trace is not None:
+                trace.attributes.update(candidates=len(attractions), activities=schedule.activities)
+        # At least one stop a day, otherwise the agent is better off planning on its own
+        return schedule if schedule.activities >= len(schedule.days) else None
+
+    def trip_days(self):
+        date_format = "%Y-%m-%d"
+        start_date = datetime.strptime(self.outbound_date, date_format)
+        end_date = datetime.strptime(self.return_date, date_format)
+        return (end_date - start_date).days
+
+    def create_batch_verification_task(self, verify_tasks):
+        """One task that verifies every draft of ``verify_tasks`` in a single LLM call"""
+        from crewai import Task
+        return Task(
+            name="verification_batch",
+            description=self.prompt(
+                "verification_batch",
+                names=", ".join(task.name for task in verify_tasks),
+                scopes=batch_scopes({task.name: VERIFY_TASKS[task.name] for task in verify_tasks}),
+            ),
+            agent=verify_tasks[0].agent,
+            expected_output="All documents verified, each under its original === name === line",
+        )
+
+    def plan_params(self):
+        """Canonical form of the trip and how its documents are verified, the plan cache key.
+
+        Cosmetic differences in the inputs don't matter.
+        """
+        def text(value):
+            return " ".join(str(value).lower().split())
+
+        return {
+            "destination": text(self.destination),
+            "hotel_city": text(self.hotel_city),
+            "departure_airport": ",".join(airport_set(self.departure_airport)),
+            "arrival_airport": ",".join(airport_set(self.arrival_airport)),
+            "outbound_date": str(self.outbound_date),
+            "return_date": str(self.return_date),
+            "num_travelers": int(self.num_travelers),
+            "adults": int(self.adults),
+            "children": int(self.children),
+            "rooms": int(self.rooms),
+            "hotel_class": int(self.hotel_class),
+            "preferences": text(self.preferences),
+            "budget": text(self.budget),
+            "special_requirements": text(self.special_requirements),
+            "flex_days": int(self.flex_days),
+            "verification_mode": self.verification_mode,
+        }
+
+    def run(self, progress=None, stream=None):
+        params = self.plan_params()
+        with self.tracer.activate("plan", destination=self.destination,
+                                  verification_mode=self.verification_mode) as trace:
+            # Waiting on someone else's identical run only produces the finished documents and search records
+            (results, self.search_records), shared = get_plan_runs().do(
+                cache_key(params), lambda: self.build_plan(params, progress, stream))
+            trace.attributes["coalesced"] = shared
+        report = self.prompt_report()
+        trace.attributes["description_tokens"] = report["description_tokens"]
+        trace.attributes["sent_prompt_tokens"] = report["sent_tokens"]
+        self.tracer.export()
+        if shared:
+            if progress:
+                progress.track([])
+            if stream:
+                for section, content in results.items():
+                    stream.show(section, content)
+
+        if self.workspace:
+            self.save_outputs(results)
+        return results
+
+    def prompt_report(self, baseline=None):
+        """Description and sent prompt tokens per task, and what the templates saved against ``baseline``"""
+        return prompt_report(self.prompts, self.tracer.spans, baseline)
+
+    def build_plan(self, params, progress=None, stream=None):
+        plan_cache = get_plan_cache()
+
+        # Sections of this exact trip that are still fresh are served without running their tasks
+        documents = plan_cache.get(params)
+        record("sections_from_cache", len(documents))
+        for section, content in documents.items():
+            if stream:
+                stream.show(section, content)
+
+        records = plan_cache.get_records(params, documents)
+
+        missing = [section for section in SECTIONS if section not in documents]
+        if missing:
+            generated, generated_records = self.generate(missing, progress, stream)
+            plan_cache.set(params, generated, generated_records)
+            documents.update(generated)
+            records.update(generated_records)
+        elif progress:
+            progress.track([])
+
+        # Fall back to an error message for every document that wasn't produced
+        results = {}
+        for section in SECTIONS:
+            content = documents.get(section, "")
+            results[section] = content or (
+                f"# {section.replace('_', ' ').title()}\n\n"
+                "Sorry, there was an issue generating this content. "
+                "Please try again or adjust your parameters."
+            )
+        return results, records
+
+    def destination_key(self):
+        """Knowledge store key: the destination alone, ignoring case, punctuation and spacing"""
+        return cache_key({"destination": " ".join(re.sub(r"[^\w\s]", " ", self.destination.lower()).split())})
+
+    def generate(self, sections, progress=None, stream=None):
+        """Run the research and verify tasks of ``sections``.
+
+        Returns the non-empty documents and the search records of their tables, both keyed by section.
+        """
+        destination_store = get_destination_store()
+        destination_knowledge = None
+        if "destination_guide" in sections:
+            _, destination_knowledge = destination_store.get(self.destination_key())
+
+        from tools.streaming import flush_llm_events
+
+        # Reuse a pooled set of agents, only the tasks are specific to this trip
+        with get_agent_pool().lease() as agents:
+            tasks = [task for task in self.create_tasks(agents, destination_knowledge)
+                     if SECTION_BY_TASK[task.name] in sections]
+            graph, scheduled = self.build_task_graph(tasks)
+            if progress:
+                progress.track(scheduled)
+
+            searches = SearchRecords()
+            listeners = [listener for listener in (progress, stream, searches) if listener]
+
+            def notify(event):
+                for listener in listeners:
+                    listener(event)
+
+            # Research tasks run concurrently, each verification starts as soon as its draft is ready
+            outputs, errors = graph.run(max_workers=4, listener=notify)
+            flush_llm_events()
+
+        # The fare heatmap needs the matrix even when the agent searched without flexible dates
+        if "flight_options" in sections and self.flex_days and "fares" not in searches.options:
+            searches(TaskEvent("search_results", "flight_research", ("fares", self.fare_matrix())))
+        for task_name, error in errors.items():
+            logging.error(f"Task {task_name} failed: {error}")
+
+        knowledge = outputs["destination_knowledge"].raw.strip() if "destination_knowledge" in outputs else ""
+        if knowledge:
+            destination_store.set(self.destination_key(), knowledge)
+
+        documents = {}
+        for section in sections:
+            content = outputs[section].raw.strip() if section in outputs else ""
+            if content:
+                documents[section] = content
+        return documents, searches.rows(documents)
+
+    def save_outputs(self, results):
+        """Write the final documents into this run's workspace and return their paths"""
+        paths = {}
+        for section, content in results.items():
+            paths[section] = self.workspace.file(f"{section}.md")
+            with open(paths[section], 'w', encoding='utf-8') as f:
+                f.write(content)
+        return paths
+
+    def build_task_graph(self, tasks):
+        """Schedule tasks by their declared ``context`` instead of their list order.
+
+        Verification tasks are wired according to ``verification_mode``. Returns the
+        graph and the tasks it runs, which include the batch task in batched mode.
+        """
+        graph = TaskGraph()
+        # crewai leaves ``context`` as a sentinel when a task declares no dependencies
+        dependencies = {task.name: [dep.name for dep in task.context] if isinstance(task.context, list) else []
+                        for task in tasks}
+        scheduled = list(tasks)
+
+        verify_tasks = [task for task in tasks if task.name in VERIFY_TASKS]
+        if self.verification_mode == "batched" and verify_tasks:
+            batch = self.create_batch_verification_task(verify_tasks)
+            drafts = {dependencies[task.name][0]: task.name for task in verify_tasks}
+            graph.add(batch.name, run_crew_task(batch, lambda outputs: "\n\n".join(
+                f"=== {drafts[name]} ===\n{output.raw}" for name, output in outputs.items()
+            )), depends_on=list(drafts))
+            scheduled.append(batch)
+
+        for task in tasks:
+            depends_on = dependencies[task.name]
+            if task.name == "itinerary_research" and PREPLAN_ITINERARY:
+                execute = preplanned_itinerary(task, self)
+            elif task.name not in VERIFY_TASKS or self.verification_mode == "full":
+                execute = run_crew_task(task)
+            elif self.verification_mode == "off":
+                execute = lambda outputs: next(iter(outputs.values()))
+            elif self.verification_mode == "validate":
+                execute = validate_then_verify(task, VERIFY_TASKS[task.name], self.trip_days())
+            else:
+                execute = take_from_batch(task.name, depends_on[0])
+                depends_on = [*depends_on, "verification_batch"]
+            graph.add(task.name, execute, depends_on=depends_on)
+        return graph, scheduled
+
+def run_crew_task(task, build_context=None):
+    """Wrap a crewai Task so it receives the raw outputs of its dependencies as context"""
+    def report_step(step):
+        # Tool calls reach the progress listeners through tools.streaming.TaskToolCalls
+        trace = current_span()
+        if trace is not None:
+            trace.add("agent_steps")
+            trace.event("agent_step", tool=getattr(step, "tool", None) or "")
+
+    task.agent.step_callback = report_step
+
+    def execute(dependency_outputs):
+        trace = current_span()
+        if trace is not None:
+            trace.attributes["agent"] = task.agent.role
+        if build_context:
+            context = build_context(dependency_outputs)
+        else:
+            context = "\n\n".join(output.raw for output in dependency_outputs.values())
+        return task.execute_sync(agent=task.agent, context=context or None)
+    return execute
+
+def preplanned_itinerary(task, crew):
+    """Solve the itinerary's schedule first so the agent only writes the prose around it"""
+    def execute(dependency_outputs):
+        schedule = crew.plan_itinerary_schedule()
+        if schedule is None:
+            return run_crew_task(task)(dependency_outputs)
+        task.description = crew.prompt("itinerary_prose", task_name=task.name)
+        return run_crew_task(task, lambda outputs: schedule.to_markdown())(dependency_outputs)
+    return execute
+
+def validate_then_verify(task, category, days):
+    """Accept a draft that passes the deterministic checks, run the verification task only when it fails"""
+    def execute(dependency_outputs):
+        draft = next(iter(dependency_outputs.values()))
+        issues = validate_document(category, draft.raw, days)
+        if not issues:
+            return draft
+        notes = "\n".join(f"- {issue}" for issue in issues)
+        verify = run_crew_task(task, lambda outputs: (
+            f"{draft.raw}\n\nAutomated checks found these problems in the draft, fix them:\n{notes}"
+        ))
+        return verify(dependency_outputs)
+    return execute
+
+def take_from_batch(name, draft_name):
+    """Cut the verified document ``name`` out of the batch output, keeping the draft if it's missing"""
+    pattern = re.compile(rf"^=== {re.escape(name)} ===[ \t]*$(.*?)(?=^=== \w+ ===[ \t]*$|\Z)",
+                         re.MULTILINE | re.DOTALL)
+
+    def execute(dependency_outputs):
+        match = pattern.search(dependency_outputs["verification_batch"].raw)
+        content = match.group(1).strip() if match else ""
+        return SectionOutput(content) if content else dependency_outputs[draft_name]
+    return execute
+
+class SearchRecords:
+    """Collect the options the search tools returned to the agents, per section.
+
+    They are what the flight and hotel documents were written from, so the
+    plan's tables show them instead of searching again with other parameters.
+    """
+
+    def __init__(self):
+        self.options = {}
+
+    def __call__(self, event: TaskEvent):
+        if event.kind != "search_results":
+            return
+        kind, options = event.payload
+        if kind == "fares":
+            # One matrix per plan, the latest search wins
+            self.options[kind] = list(options)
+            return
+        found = self.options.setdefault(kind, [])
+        found.extend(option for option in options if option not in found)
+        if kind == "flights":
+            found.sort(key=lambda option: option.sort_key())
+
+    def rows(self, sections):
+        """JSON ready records of ``sections`` by kind of search, as stored in the plan cache"""
+        rows = {}
+        for kind, options in self.options.items():
+            if SECTION_BY_SEARCH[kind] in sections:
+                rows.setdefault(SECTION_BY_SEARCH[kind], {})[kind] = [
+                    asdict(option) if is_dataclass(option) else option for option in options]
+        return rows
+
+class RunProgress:
+    """Drive the progress bar and a per-agent status panel from task graph events"""
+
+    def __init__(self, progress_bar, status_panel):
+        self.progress_bar = progress_bar
+        self.status_panel = status_panel
+        self.agents = {}
+        self.status = {}
+        self.completed = 0
+
+    def track(self, tasks):
+        self.agents = {task.name: task.agent.role for task in tasks}
+        self.status = {task.name: "⏳ Waiting" for task in tasks}
+        self.completed = 0
+        self.render()
+
+    def __call__(self, event: TaskEvent):
+        if event.task not in self.status:
+            return
+        if event.kind == "task_started":
+            self.status[event.task] = "🔄 Working"
+        elif event.kind == "tool_call":
+            self.status[event.task] = f"🔧 Using {event.payload['tool']}"
+        elif event.kind == "task_finished":
+            self.status[event.task] = "✅ Done"
+            self.completed += 1
+        elif event.kind == "task_failed":
+            self.status[event.task] = "❌ Failed"
+            self.completed += 1
+        else:
+            return
+        self.render()
+
+    def render(self):
+        if not self.status:
+            self.progress_bar.progress(1.0, text="Served from cache")
+            return
+        total = len(self.status)
+        self.progress_bar.progress(self.completed / total, text=f"{self.completed}/{total} tasks complete")
+        self.status_panel.markdown("\n".join(
+            f"- **{self.agents[name]}** · {name.replace('_', ' ')}: {status}"
+            for name, status in self.status.items()
+        ))
+
+class ResultStream:
+    """Fill the result tabs while the crew is working.
+
+    Streamed tokens of a task are shown once the agent starts its final answer,
+    a finished research draft stays visible until the verified version
+    replaces it in the same placeholder.
+    """
+
+    FINAL_ANSWER = "Final Answer:"
+    REACT_LABELS = ("Thought:", "Action:")
+    MIN_RENDER_INTERVAL = 0.25
+
+    def __init__(self, placeholders):
+        self.placeholders = placeholders
+        self.buffers = {}
+        self.last_render = {}
+
+    def __call__(self, event: TaskEvent):
+        section = SECTION_BY_TASK.get(event.task)
+        if section is None:
+            return
+
+        if event.kind == "task_started":
+            self.buffers[event.task] = ""
+        elif event.kind == "token":
+            self.buffers[event.task] = self.buffers.get(event.task, "") + event.payload
+            answer = self.final_answer(self.buffers[event.task])
+            # Throttled, every markdown update is a round trip to the browser
+            now = time.monotonic()
+            if answer and now - self.last_render.get(section, 0) >= self.MIN_RENDER_INTERVAL:
+                self.placeholders[section].markdown(answer + " ▌", unsafe_allow_html=True)
+                self.last_render[section] = now
+        elif event.kind == "task_finished":
+            self.buffers.pop(event.task, None)
+            content = event.payload.raw
+            if event.task != section:
+                content = "_Draft, our verification specialist is reviewing it..._\n\n" + content
+            self.show(section, content)
+
+    def show(self, section, content):
+        self.placeholders[section].markdown(content, unsafe_allow_html=True)
+
+    def flush(self):
+        """Render the newest text of every task still writing, the throttle may have held it back"""
+        for task, text in self.buffers.items():
+            answer = self.final_answer(text)
+            if answer:
+                self.placeholders[SECTION_BY_TASK[task]].markdown(answer + " ▌", unsafe_allow_html=True)
+
+    def final_answer(self, text):
+        # Agents think out loud before answering; only the answer belongs in the tab
+        _, marker, answer = text.partition(self.FINAL_ANSWER)
+        if marker:
+            return answer.strip()
+        # With native tool calling the answer comes without any ReAct markers
+        head = text.lstrip()[:len("Thought:")]
+        if not head or any(label.startswith(head) or head.startswith(label) for label in self.REACT_LABELS):
+            return ""
+        return text.strip()
 
 def display_agent_cards():
     col1, col2, col3, col4 = st.columns(4)
@@ -696,9 +995,11 @@ def main():
         st.markdown('### ✈️ Flight Information')
         col1, col2 = st.columns(2)
         with col1:
-            departure_airport = st.text_input("Departure Airport (Code)", "HYD", key="departure")
+            departure_airport = st.text_input("Departure Airport (Code)", "HYD", key="departure",
+                                              help="Several nearby airports can be given comma separated, e.g. HYD, BLR")
         with col2:
-            arrival_airport = st.text_input("Arrival Airport (Code)", "BKK", key="arrival")
+            arrival_airport = st.text_input("Arrival Airport (Code)", "BKK", key="arrival",
+                                            help="Several nearby airports can be given comma separated, e.g. BKK, DMK")
         
         # Date selection
         today = datetime.now().date()
@@ -710,6 +1011,8 @@ def main():
             outbound_date = st.date_input("Departure Date", tomorrow + timedelta(days=100), key="outbound")
         with col2:
             return_date = st.date_input("Return Date", tomorrow + timedelta(days=107), key="return")
+        flex_days = st.slider("Flexible Dates (± days)", min_value=0, max_value=FLIGHT_FLEX_DAYS_MAX, value=0,
+                              help="Compare fares for dates around the ones you picked", key="flex_days")
             
         
         # Traveler details
@@ -750,160 +1053,290 @@ def main():
         """, unsafe_allow_html=True)
     
     # Main content area
+    executor = get_job_executor()
     if st.button('✨ Create My Travel Plan', use_container_width=True, key="generate"):
         # Format dates as strings
         outbound_date_str = outbound_date.strftime("%Y-%m-%d")
         return_date_str = return_date.strftime("%Y-%m-%d")
+
+        travel_crew = TravelPlanningCrew(
+            destination=destination,
+            departure_airport=departure_airport,
+            arrival_airport=arrival_airport,
+            outbound_date=outbound_date_str,
+            return_date=return_date_str,
+            num_travelers=num_travelers,
+            hotel_city=hotel_city,
+            rooms=rooms,
+            adults=adults,
+            children=children,
+            hotel_class=hotel_class,
+            preferences=preferences,
+            budget=budget,
+            special_requirements=special_requirements,
+            flex_days=flex_days
+        )
+
+        # The crew runs in the background; pressing the button again for the same trip joins the running job
+        job, _ = executor.submit(cache_key(travel_crew.plan_params()), run_plan_job, payload=travel_crew)
+        st.session_state["plan_job"] = job.id
+        st.query_params["job"] = job.id
+
+    # Reattach to the plan of this session, also after a rerun or a page reload
+    job = executor.get(st.session_state.get("plan_job") or st.query_params.get("job"))
+    if job:
+        st.session_state["plan_job"] = job.id
+        display_plan_job(job)
+
+def run_plan_job(job):
+    """Background part of a plan: progress and streamed output go to the job log, not to Streamlit.
+
+    Returns the documents and the search records their tables are built from.
+    """
+    results = job.payload.run(job.channel("progress"), job.channel("stream"))
+    return results, job.payload.search_records
+
+def display_plan_layout(job):
+    """Header, progress and result tabs of a plan job, filled with everything the job reported so far"""
+    # Show progress while calculating with animated header
+    st.markdown("""
+    <div style="text-align: center; margin-bottom: 30px;">
+        <h2 class="sub-header" style="border: none;">Building your personalized travel plan...</h2>
+        <div style="font-size: 3rem;" class="floating">
+            ✈️ 🌍 🏨 📅
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    progress_bar = st.progress(0)
+    status_panel = st.empty()
+    
+    # Create tabs for organized results with custom styling
+    tabs = st.tabs([
+        "🌍 Destination Guide", 
+        "✈️ Flight Options", 
+        "🏨 Hotel Recommendations", 
+        "📅 Itinerary"
+    ])
+
+    # Each tab gets a placeholder that is filled while the agents write and replaced by the final version
+    tab_headers = [
+        ("#6B73FF", "🌍 Destination Guide"),
+        ("#FFA726", "✈️ Flight Options"),
+        ("#66BB6A", "🏨 Hotel Recommendations"),
+        ("#AB47BC", "📅 Personalized Itinerary"),
+    ]
+    placeholders = {}
+    for tab, section, (color, title) in zip(tabs, SECTIONS, tab_headers):
+        with tab:
+            st.markdown(f"""
+            <div class="tab-content">
+                <h3 style="color: {color}; border-bottom: 2px solid #dfe6e9; padding-bottom: 10px;">
+                    {title}
+                </h3>
+            """, unsafe_allow_html=True)
+            placeholders[section] = st.empty()
+            st.markdown("</div>", unsafe_allow_html=True)
+
+    # Replay what the job reported so far onto this script run's elements
+    targets = {"progress": RunProgress(progress_bar, status_panel), "stream": ResultStream(placeholders)}
+    job.replay(targets)
+    targets["stream"].flush()
+    return tabs, placeholders
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def follow_plan_job(job):
+    """Progress and streamed text of a running job; only this fragment reruns, the script thread stays free"""
+    if job.done:
+        # A full rerun replaces the streamed text with the finished plan
+        st.rerun()
+    st.caption('Our AI agents crew are working on your perfect travel plan please be patient...')
+    display_plan_layout(job)
+
+def display_plan_job(job):
+    if not job.done:
+        follow_plan_job(job)
+        return
+    travel_crew = job.payload
+    tabs, placeholders = display_plan_layout(job)
+    
+    try:
+        results, search_records = job.result()
+
+        # Replace the streamed text with the final documents
+        for section, content in results.items():
+            placeholders[section].markdown(content, unsafe_allow_html=True)
+        # Sortable tables of the options the agents were given, next to their write-up
+        flight_records = search_records.get("flight_options", {})
+        try:
+            with tabs[1]:
+                display_flight_table(flight_records.get("flights"))
+                if travel_crew.flex_days:
+                    display_fare_heatmap(flight_records.get("fares"))
+            with tabs[2]:
+                display_hotel_table(search_records.get("hotel_recommendations", {}).get("hotels"))
+        except Exception as e:
+            # The documents are complete without them, a broken table must not cost the download
+            logging.warning(f"Search result tables unavailable: {e}")
         
-        # Show progress while calculating with animated header
+        # Success message with animation
         st.markdown("""
-        <div style="text-align: center; margin-bottom: 30px;">
-            <h2 class="sub-header" style="border: none;">Building your personalized travel plan...</h2>
-            <div style="font-size: 3rem;" class="floating">
-                ✈️ 🌍 🏨 📅
-            </div>
+        <div class="success-message" style="animation: fadeIn 1s ease-in-out;">
+            <h3 style="margin: 0; display: flex; align-items: center;">
+                <span style="margin-right: 10px;">🎉</span> Your travel plan is ready!
+            </h3>
+            <p style="margin: 10px 0 0 0;">Explore the tabs above to see your personalized recommendations.</p>
         </div>
         """, unsafe_allow_html=True)
         
-        progress_bar = st.progress(0)
+        # Add a download button for the full plan
+        col1, col2, col3 = st.columns([1,2,1])
+        with col2:
+            st.download_button(
+                label="📥 Download Full Travel Plan",
+                data=create_zip_file(results, search_records),
+                file_name=f"{travel_crew.destination}_travel_plan.zip",
+                mime="application/zip",
+                use_container_width=True
+            )
         
-        # Create tabs for organized results with custom styling
-        tab1, tab2, tab3, tab4 = st.tabs([
-            "🌍 Destination Guide", 
-            "✈️ Flight Options", 
-            "🏨 Hotel Recommendations", 
-            "📅 Itinerary"
-        ])
+    except Exception as e:
+        # Log the error for debugging
+        logging.error(f"Travel plan generation error: {str(e)}")
         
-        with st.spinner('Our AI agents crew are working on your perfect travel plan please be patient...'):
-            travel_crew = TravelPlanningCrew(
-                destination=destination,
-                departure_airport=departure_airport,
-                arrival_airport=arrival_airport,
-                outbound_date=outbound_date_str,
-                return_date=return_date_str,
-                num_travelers=num_travelers,
-                hotel_city=hotel_city,
-                rooms=rooms,
-                adults=adults,
-                children=children,
-                hotel_class=hotel_class,
-                preferences=preferences,
-                budget=budget,
-                special_requirements=special_requirements
-            )
-            
-            try:
-                # Run the crew and get results
-                result_files = travel_crew.run(progress_bar)
-                
-                # Process the results with enhanced tab styling
-                with tab1:  # Destination Guide
-                    st.markdown("""
-                    <div class="tab-content">
-                        <h3 style="color: #6B73FF; border-bottom: 2px solid #dfe6e9; padding-bottom: 10px;">
-                            🌍 Destination Guide
-                        </h3>
-                    """, unsafe_allow_html=True)
-                    content = display_markdown_file(
-                        result_files["destination_guide"],
-                        "Destination information will be displayed here"
-                    )
-                    st.markdown(content, unsafe_allow_html=True)
-                    st.markdown("</div>", unsafe_allow_html=True)
-                
-                with tab2:  # Flight Options
-                    st.markdown("""
-                    <div class="tab-content">
-                        <h3 style="color: #FFA726; border-bottom: 2px solid #dfe6e9; padding-bottom: 10px;">
-                            ✈️ Flight Options
-                        </h3>
-                    """, unsafe_allow_html=True)
-                    content = display_markdown_file(
-                        result_files["flight_options"],
-                        "Flight options will be displayed here"
-                    )
-                    st.markdown(content, unsafe_allow_html=True)
-                    st.markdown("</div>", unsafe_allow_html=True)
-                
-                with tab3:  # Hotel Recommendations
-                    st.markdown("""
-                    <div class="tab-content">
-                        <h3 style="color: #66BB6A; border-bottom: 2px solid #dfe6e9; padding-bottom: 10px;">
-                            🏨 Hotel Recommendations
-                        </h3>
-                    """, unsafe_allow_html=True)
-                    content = display_markdown_file(
-                        result_files["hotel_recommendations"],
-                        "Hotel recommendations will be displayed here"
-                    )
-                    st.markdown(content, unsafe_allow_html=True)
-                    st.markdown("</div>", unsafe_allow_html=True)
-                    
-                with tab4:  # Itinerary
-                    st.markdown("""
-                    <div class="tab-content">
-                        <h3 style="color: #AB47BC; border-bottom: 2px solid #dfe6e9; padding-bottom: 10px;">
-                            📅 Personalized Itinerary
-                        </h3>
-                    """, unsafe_allow_html=True)
-                    content = display_markdown_file(
-                        result_files["itinerary_recommendations"],
-                        "Your day-by-day itinerary will be displayed here"
-                    )
-                    st.markdown(content, unsafe_allow_html=True)
-                    st.markdown("</div>", unsafe_allow_html=True)
-                
-                # Success message with animation
-                st.markdown("""
-                <div class="success-message" style="animation: fadeIn 1s ease-in-out;">
-                    <h3 style="margin: 0; display: flex; align-items: center;">
-                        <span style="margin-right: 10px;">🎉</span> Your travel plan is ready!
-                    </h3>
-                    <p style="margin: 10px 0 0 0;">Explore the tabs above to see your personalized recommendations.</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Add a download button for the full plan
-                col1, col2, col3 = st.columns([1,2,1])
-                with col2:
-                    st.download_button(
-                        label="📥 Download Full Travel Plan",
-                        data=create_zip_file(result_files),
-                        file_name=f"{destination}_travel_plan.zip",
-                        mime="application/zip",
-                        use_container_width=True
-                    )
-                
-            except Exception as e:
-                # Log the error for debugging
-                import logging
-                logging.error(f"Travel plan generation error: {str(e)}")
-                
-                # Show a more specific error message to the user
-                error_type = type(e).__name__
-                st.error(f"Error while generating travel plan: {error_type}")
-                
-                # Show more details in an expander for technical users
-                with st.expander("Technical Details"):
-                    st.code(str(e))
-                
-                # Provide a helpful message before showing fallback data
-                st.warning("We couldn't generate a personalized travel plan based on your inputs.")
-                
-  
-
-def create_zip_file(result_files):
-    """Create a zip file containing all travel plan documents"""
+        # Show a more specific error message to the user
+        error_type = type(e).__name__
+        st.error(f"Error while generating travel plan: {error_type}")
+        
+        # Show more details in an expander for technical users
+        with st.expander("Technical Details"):
+            st.code(str(e))
+        
+        # Provide a helpful message before showing fallback data
+        st.warning("We couldn't generate a personalized travel plan based on your inputs.")
+
+    if st.query_params.get("debug") or os.getenv("TRAVEL_DEBUG_PANEL"):
+        display_trace(travel_crew.tracer, travel_crew.prompt_report())
+
+def display_trace(tracer, prompts=None):
+    """Debug panel: waterfall of the run's spans, prompt tokens per task and the trace as JSONL or OTLP JSON"""
+    import json
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    spans = sorted(tracer.spans, key=lambda span: span.start)
+    if not spans:
+        return
+    with st.expander("🛠️ Run trace", expanded=False):
+        origin = spans[0].start
+        colors = {"run": "#6B73FF", "task": "#AB47BC", "llm": "#FFA726", "tool": "#66BB6A", "http": "#26A69A"}
+        depth = {}
+        for span in spans:
+            depth[span.span_id] = depth.get(span.parent_id, -1) + 1
+        labels = [f"{'  ' * depth[span.span_id]}{span.name} [{span.span_id[:4]}]" for span in spans]
+        figure = go.Figure(go.Bar(
+            y=labels, x=[span.duration for span in spans], base=[span.start - origin for span in spans],
+            orientation="h", marker_color=[colors.get(span.kind, "#b2bec3") for span in spans],
+            hovertext=[json.dumps(span.attributes, default=str) for span in spans], hoverinfo="text+x",
+        ))
+        figure.update_layout(xaxis_title="seconds since start", yaxis=dict(autorange="reversed", type="category"),
+                             height=max(300, 22 * len(spans)), margin=dict(l=10, r=10, t=10, b=10))
+        st.plotly_chart(figure, use_container_width=True)
+
+        st.dataframe(pd.DataFrame([{
+            "span": span.name, "kind": span.kind, "seconds": round(span.duration, 3), "status": span.status,
+            **{key: value for key, value in span.attributes.items() if isinstance(value, (int, float, bool))},
+        } for span in spans]), hide_index=True, use_container_width=True)
+
+        if prompts and prompts["tasks"]:
+            st.caption(f"Task descriptions made up {prompts['description_tokens']:,} of the "
+                       f"{prompts['sent_tokens']:,} prompt tokens the tasks' LLM calls sent")
+            st.dataframe(pd.DataFrame(prompts["tasks"]), hide_index=True, use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download JSONL trace", tracer.to_jsonl(), file_name=f"{tracer.trace_id}.jsonl",
+                               mime="application/jsonl", use_container_width=True)
+        with col2:
+            st.download_button("Download OTLP JSON", json.dumps(tracer.to_otel()),
+                               file_name=f"{tracer.trace_id}.otlp.json", mime="application/json",
+                               use_container_width=True)
+
+
+def options_frame(records):
+    """Search records as a DataFrame, with list fields joined for display"""
+    import pandas as pd
+
+    rows = [{name: ", ".join(value) if isinstance(value, (list, tuple)) else value
+             for name, value in record.items()} for record in records]
+    return pd.DataFrame.from_records(rows)
+
+def display_flight_table(records):
+    """Every itinerary the flight agent was given; columns sort in the browser, without another LLM call"""
+    if not records:
+        return
+    st.markdown("#### 🔎 All Flights Found")
+    st.dataframe(options_frame(records), hide_index=True, use_container_width=True, column_config={
+        "airline": "Airline",
+        "flight_numbers": "Flights",
+        "departure": "Departure",
+        "arrival": "Arrival",
+        "duration": st.column_config.NumberColumn("Duration (min)"),
+        "stops": st.column_config.NumberColumn("Stops"),
+        "price": st.column_config.NumberColumn("Price (INR)", format="₹%d"),
+    })
+
+def display_hotel_table(records):
+    """Every hotel the hotel agent was given, ranked by value like the agent saw them"""
+    if not records:
+        return
+    st.markdown("#### 🔎 All Hotels Found")
+    st.dataframe(options_frame(records), hide_index=True, use_container_width=True, column_config={
+        "name": "Hotel",
+        "hotel_class": st.column_config.NumberColumn("Class", format="%d★"),
+        "rating": st.column_config.NumberColumn("Rating", format="%.1f"),
+        "reviews": st.column_config.NumberColumn("Reviews"),
+        "price_per_night": st.column_config.NumberColumn("Per night (INR)", format="₹%d"),
+        "total_price": st.column_config.NumberColumn("Total (INR)", format="₹%d"),
+        "amenities": "Amenities",
+    })
+
+def display_fare_heatmap(records):
+    """Cheapest fare per outbound/return date pair around the chosen dates, from the run's fare matrix"""
+    import plotly.graph_objects as go
+
+    matrix = {(record["outbound"], record["return"]): record["price"] for record in records or []}
+    outbound_dates = sorted({outbound for outbound, _ in matrix})
+    return_dates = sorted({inbound for _, inbound in matrix})
+    fares = [[matrix.get((outbound, inbound)) for inbound in return_dates] for outbound in outbound_dates]
+    if not any(fare for row in fares for fare in row):
+        st.info("No fares found for the flexible date window.")
+        return
+
+    figure = go.Figure(go.Heatmap(
+        z=fares, x=return_dates, y=outbound_dates, colorscale="RdYlGn_r",
+        text=[["-" if fare is None else f"₹{fare:,}" for fare in row] for row in fares],
+        texttemplate="%{text}", hovertemplate="Out %{y}<br>Back %{x}<br>%{text}<extra></extra>",
+        colorbar=dict(title="INR"),
+    ))
+    figure.update_layout(title="Cheapest fare by travel dates", xaxis_title="Return date",
+                         yaxis_title="Departure date", xaxis_type="category", yaxis_type="category",
+                         height=420, margin=dict(l=10, r=10, t=50, b=10))
+    st.plotly_chart(figure, use_container_width=True)
+
+def create_zip_file(results, search_records=None):
+    """Create a zip file containing all travel plan documents and the search results behind them"""
     import zipfile
     import io
     
     zip_buffer = io.BytesIO()
     with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-        for file_name, file_path in result_files.items():
-            if os.path.exists(file_path):
-                with open(file_path, 'rb') as file:
-                    zip_file.writestr(f"{file_name}.md", file.read())
+        for file_name, content in results.items():
+            zip_file.writestr(f"{file_name}.md", content)
+        for section, records in (search_records or {}).items():
+            for kind, rows in records.items():
+                if rows:
+                    zip_file.writestr(f"{section}_{kind}.csv", options_frame(rows).to_csv(index=False))
     
     zip_buffer.seek(0)
     return zip_buffer.getvalue()
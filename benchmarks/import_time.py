@@ -0,0 +1,85 @@
+"""Import-time budget check for app.py.
+
+Streamlit re-runs app.py on every widget interaction, so whatever it imports
+at module level is paid again and again. This script imports the app with
+``python -X importtime`` in a fresh interpreter, fails when the cumulative
+import time exceeds the budget, and fails when one of the heavy libraries
+that must stay lazy is imported eagerly.
+
+    python benchmarks/import_time.py --budget-ms 2500
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed when a plan is generated; importing any of them at module level is a regression
+LAZY_MODULES = (
+    "crewai",
+    "crewai_tools",
+    "pandas",
+    "plotly",
+    "matplotlib",
+    "networkx",
+    "serpapi",
+)
+
+
+def measure(module="app", repeat=3):
+    """Return ``(best cumulative microseconds, {module: cumulative microseconds})`` over ``repeat`` runs"""
+    env = dict(os.environ)
+    env.setdefault("SERPER_API_KEY", "benchmark")
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    best_total, best_modules = None, {}
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+        modules = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+            if cumulative.isdigit():
+                modules[name.strip()] = int(cumulative)
+        total = modules.get(module, 0)
+        if best_total is None or total < best_total:
+            best_total, best_modules = total, modules
+    return best_total, best_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", 2500)))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="show the N slowest top-level imports")
+    args = parser.parse_args()
+
+    total, modules = measure(args.module, args.repeat)
+    print(f"import {args.module}: {total / 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    top_level = sorted(((us, name) for name, us in modules.items() if "." not in name and name != args.module),
+                       reverse=True)
+    for us, name in top_level[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if total / 1000 > args.budget_ms:
+        failures.append(f"import time {total / 1000:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    # Streamlit pulls some of these in on its own; only flag what the app adds
+    _, baseline = measure("streamlit", 1)
+    eager = [name for name in LAZY_MODULES if name in modules and name not in baseline]
+    if eager:
+        failures.append(f"heavy modules imported at startup: {', '.join(eager)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Load test: many concurrent users planning trips against one app process.
+
+Every simulated user drives its own session, either through Streamlit's
+AppTest (``--driver apptest``, the full script including the background
+job, rerun until the plan is shown) or headless through TravelPlanningCrew
+(``--driver direct``). Upstreams are the stub servers of
+benchmarks/stubs.py, so only the app itself is under load.
+
+The report covers throughput, latency percentiles, the error rate and file
+collisions: files written by more than one plan run, which would mean
+concurrent users overwrite each other's output. Every run exports its trace
+and direct runs also persist their documents, so there are files to check;
+a load test that wrote none fails.
+
+    python benchmarks/load_test.py --users 20 --distinct-trips 5 --llm-latency-ms 1500
+"""
+import argparse
+import builtins
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from plan_benchmark import BASE_TRIP, percentile  # noqa: E402
+from stubs import StubUpstreams  # noqa: E402
+
+
+class WriteLog:
+    """Records which plan run opened which file for writing, to find runs clobbering each other.
+
+    Only files below ``roots`` count; libraries writing their own lock or
+    config files elsewhere are expected to share them.
+    """
+
+    def __init__(self, roots):
+        self.roots = tuple(os.path.join(os.path.abspath(root), "") for root in roots)
+        self.writers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._open = builtins.open
+
+    def __enter__(self):
+        from tools.tracing import _current
+
+        def tracked_open(file, mode="r", *args, **kwargs):
+            if isinstance(file, (str, bytes, os.PathLike)) and any(flag in mode for flag in "wax+"):
+                path = os.path.abspath(os.fsdecode(file))
+                if path.startswith(self.roots):
+                    current = _current.get()
+                    writer = current[0].trace_id if current else threading.current_thread().name
+                    with self._lock:
+                        self.writers[path].add(writer)
+            return self._open(file, mode, *args, **kwargs)
+
+        builtins.open = tracked_open
+        return self
+
+    def __exit__(self, *exc):
+        builtins.open = self._open
+
+    def collisions(self):
+        return {path: len(writers) for path, writers in self.writers.items() if len(writers) > 1}
+
+
+def trip_for(user, distinct_trips):
+    """Users share ``distinct_trips`` different trips, so identical requests overlap on purpose"""
+    variant = user % distinct_trips
+    outbound = date(2027, 3, 10) + timedelta(days=variant)
+    return dict(BASE_TRIP, outbound_date=outbound.isoformat(),
+                return_date=(outbound + timedelta(days=4 + variant % 3)).isoformat(),
+                adults=2, children=variant % 3, rooms=1)
+
+
+# What TravelPlanningCrew.run puts in place of a section it could not generate
+FALLBACK_MESSAGE = "Sorry, there was an issue generating this content."
+
+
+def run_direct(user, trip, timeout):
+    import app
+    # Persisted like a run that keeps its documents, so concurrent runs' files can collide
+    crew = app.TravelPlanningCrew(num_travelers=trip["adults"] + trip["children"], persist_outputs=True, **trip)
+    results = crew.run()
+    failed = [section for section, content in results.items() if FALLBACK_MESSAGE in content]
+    if failed:
+        raise RuntimeError(f"sections not generated: {', '.join(failed)}")
+
+
+# Seconds between two reruns of an AppTest session waiting for its plan
+POLL_INTERVAL_S = 0.5
+
+
+def run_apptest(user, trip, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+    at.run()
+    at.text_input(key="destination").input(trip["destination"])
+    at.text_input(key="hotel_city").input(trip["hotel_city"])
+    at.date_input(key="outbound").set_value(date.fromisoformat(trip["outbound_date"]))
+    at.date_input(key="return").set_value(date.fromisoformat(trip["return_date"]))
+    at.number_input(key="adults").set_value(trip["adults"])
+    at.number_input(key="children").set_value(trip["children"])
+    at.button(key="generate").click().run()
+    # The script only follows the background job in a fragment and returns, so rerun it like the
+    # browser would until the finished plan is shown
+    deadline = time.monotonic() + timeout
+    while True:
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        if at.error:
+            raise RuntimeError(at.error[0].value)
+        if any("Your travel plan is ready" in element.value for element in at.markdown):
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError("the plan did not finish")
+        time.sleep(POLL_INTERVAL_S)
+        at.run()
+
+
+DRIVERS = {"apptest": run_apptest, "direct": run_direct}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--distinct-trips", type=int, default=0, help="different trips among the users (default: all)")
+    parser.add_argument("--driver", choices=sorted(DRIVERS), default="apptest")
+    parser.add_argument("--ramp-up-s", type=float, default=0, help="spread user starts over this many seconds")
+    parser.add_argument("--timeout-s", type=float, default=600)
+    parser.add_argument("--serpapi-latency-ms", type=float, default=0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0)
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    distinct = args.distinct_trips or args.users
+    upstreams = StubUpstreams(args.serpapi_latency_ms / 1000, args.llm_latency_ms / 1000, args.llm_tokens_per_second)
+    with upstreams, tempfile.TemporaryDirectory() as scratch:
+        os.environ.update(upstreams.environ())
+        os.environ["TRAVEL_CACHE_PATH"] = os.path.join(scratch, "cache.sqlite3")
+        os.environ["TRAVEL_RUNS_DIR"] = os.path.join(scratch, "runs")
+        os.environ["TRAVEL_TRACE_DIR"] = os.path.join(scratch, "traces")
+        driver = DRIVERS[args.driver]
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def user_session(user):
+            time.sleep(args.ramp_up_s * user / max(args.users, 1))
+            started = time.perf_counter()
+            try:
+                driver(user, trip_for(user, distinct), args.timeout_s)
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                with lock:
+                    errors.append(f"user {user}: {type(e).__name__}: {e}")
+
+        with WriteLog([os.getcwd(), ROOT, scratch]) as writes:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix="user") as pool:
+                list(pool.map(user_session, range(args.users)))
+            wall = time.perf_counter() - started
+
+        report = {
+            "driver": args.driver,
+            "users": args.users,
+            "distinct_trips": distinct,
+            "wall_s": round(wall, 3),
+            "completed": len(latencies),
+            "throughput_plans_per_min": round(len(latencies) / wall * 60, 2) if wall else 0.0,
+            "latency_s": {f"p{pct}": round(percentile(latencies, pct), 3) for pct in (50, 90, 95, 99)}
+            if latencies else {},
+            "error_rate": round(len(errors) / args.users, 4),
+            "errors": errors[:20],
+            "files_written": len(writes.writers),
+            "file_collisions": writes.collisions(),
+            "upstream_requests": {"serpapi": upstreams.serpapi.requests, "llm": upstreams.llm.requests},
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if not report["files_written"]:
+        print("No plan run wrote a file, the collision check didn't test anything")
+        return 1
+    return 1 if errors or report["file_collisions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""Offline benchmark of the finder tools and full plan generation.
+
+Recorded SerpAPI responses and LLM completions are served by local stub
+servers (see benchmarks/stubs.py) with injected latency, so the numbers
+only move when the code does. Every scenario of the matrix is planned
+``--repeat`` times from cold caches and once more from a warm plan cache;
+the tools are timed cold and warm on their own. Results are written as one
+JSON artifact, and ``--compare`` prints the change against an earlier one.
+
+    python benchmarks/plan_benchmark.py --output bench.json --serpapi-latency-ms 800 --llm-latency-ms 1500
+    python benchmarks/plan_benchmark.py --output new.json --compare bench.json
+
+``--smoke`` plans a single scenario once, as a quick check of the harness. Any
+run exits with 1 when a cold plan recorded no LLM spans, since its token
+numbers would be meaningless, or no tool calls, since the search latency
+would be missing from its timings.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import StubUpstreams, load_fixture  # noqa: E402
+
+BASE_TRIP = dict(
+    destination="Bangkok, Thailand",
+    departure_airport="HYD",
+    arrival_airport="BKK",
+    outbound_date="2027-03-10",
+    hotel_city="Bangkok",
+    hotel_class=4,
+    preferences="historical sites, local cuisine, nature, shopping",
+    budget="Mid-range",
+    special_requirements="Child-friendly activities, Transport & Connectivity",
+)
+
+# Trip shapes that change how much the agents search and write
+SCENARIOS = {
+    "short_couple": dict(return_date="2027-03-13", adults=2, children=0, rooms=1),
+    "long_couple": dict(return_date="2027-03-24", adults=2, children=0, rooms=1),
+    "family": dict(return_date="2027-03-17", adults=2, children=2, rooms=1),
+    "multi_room": dict(return_date="2027-03-17", adults=4, children=2, rooms=3),
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(values):
+    return {
+        "mean": round(statistics.mean(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def reset_caches(app):
+    from tools.flightAgent import flight_cache
+    from tools.HotelAgent import hotel_cache
+    from tools.itinerary import attraction_cache
+    for cache in (flight_cache, hotel_cache, attraction_cache, app.get_destination_store()):
+        cache.invalidate()
+    app.get_plan_cache().invalidate()
+
+
+def make_crew(app, scenario):
+    trip = dict(BASE_TRIP, **SCENARIOS[scenario])
+    trip["num_travelers"] = trip["adults"] + trip["children"]
+    return app.TravelPlanningCrew(**trip)
+
+
+def legacy_prompt_tokens(crew):
+    """Tokens of the hand written task descriptions the prompt templates replaced, for this crew's trip"""
+    from tools.prompts import measure_descriptions
+    descriptions = load_fixture("legacy_prompts.json")
+    verified = [name for name in crew.prompts if name in ("destination_knowledge", "flight_options",
+                                                          "hotel_recommendations", "itinerary_recommendations")]
+    return measure_descriptions(
+        descriptions, **vars(crew), days=crew.trip_days(), names=", ".join(verified),
+        airport_sets_note=crew.airport_sets_note(), flexible_dates_note=crew.flexible_dates_note(),
+        guide_source="the destination guide provided as context.",
+    )
+
+
+def trace_summary(tracer):
+    """Per-task seconds, LLM and tool calls and tokens from the run's spans"""
+    tasks, calls, tool_calls, prompt_tokens, completion_tokens = {}, 0, 0, 0, 0
+    for span in tracer.spans:
+        if span.kind == "task":
+            tasks[span.name] = round(span.duration, 4)
+        elif span.kind == "tool":
+            tool_calls += 1
+        elif span.kind == "llm":
+            calls += 1
+            prompt_tokens += span.attributes.get("prompt_tokens", 0)
+            completion_tokens += span.attributes.get("completion_tokens", 0)
+    return {"tasks": tasks, "llm_calls": calls, "tool_calls": tool_calls, "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens}
+
+
+class ToolCallEvents:
+    """Progress listener counting the ``tool_call`` events a plan's tasks emit"""
+
+    def __init__(self):
+        self.count = 0
+
+    def track(self, tasks):
+        pass
+
+    def __call__(self, event):
+        if event.kind == "tool_call":
+            self.count += 1
+
+
+def bench_plan(app, scenario, repeat):
+    runs = []
+    for _ in range(repeat):
+        reset_caches(app)
+        crew = make_crew(app, scenario)
+        tool_call_events = ToolCallEvents()
+        tracemalloc.start()
+        started = time.perf_counter()
+        crew.run(progress=tool_call_events)
+        wall = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        runs.append(dict(wall_s=wall, peak_mb=peak / 2 ** 20, prompt_tokens_saved=crew.prompt_report(legacy_prompt_tokens(crew))["tokens_saved"],
+                         tool_call_events=tool_call_events.count, **trace_summary(crew.tracer)))
+
+    # Same trip again, every section comes from the plan cache
+    started = time.perf_counter()
+    make_crew(app, scenario).run()
+    warm = time.perf_counter() - started
+
+    task_names = sorted({name for run in runs for name in run["tasks"]})
+    return {
+        "wall_s": summarize([run["wall_s"] for run in runs]),
+        "warm_wall_s": round(warm, 4),
+        "peak_mb": round(max(run["peak_mb"] for run in runs), 2),
+        "tasks_s": {name: summarize([run["tasks"][name] for run in runs if name in run["tasks"]])
+                    for name in task_names},
+        "llm_calls": runs[-1]["llm_calls"],
+        "tool_calls": runs[-1]["tool_calls"],
+        "tool_call_events": runs[-1]["tool_call_events"],
+        "prompt_tokens": runs[-1]["prompt_tokens"],
+        "completion_tokens": runs[-1]["completion_tokens"],
+        "prompt_tokens_saved": runs[-1]["prompt_tokens_saved"],
+    }
+
+
+def bench_tools(app, scenario):
+    from tools.flightAgent import FlightsFinderTool
+    from tools.HotelAgent import HotelsFinderTool
+
+    trip = dict(BASE_TRIP, **SCENARIOS[scenario])
+    calls = {
+        "flights": (FlightsFinderTool(), dict(
+            departure_airport=trip["departure_airport"], arrival_airport=trip["arrival_airport"],
+            outbound_date=trip["outbound_date"], return_date=trip["return_date"],
+            adults=trip["adults"], children=trip["children"])),
+        "hotels": (HotelsFinderTool(), dict(
+            q=trip["hotel_city"], check_in_date=trip["outbound_date"], check_out_date=trip["return_date"],
+            adults=trip["adults"], children=trip["children"], rooms=trip["rooms"], rating=8,
+            hotel_class=str(trip["hotel_class"]), max_price_per_night=None)),
+    }
+    reset_caches(app)
+    timings = {}
+    for name, (tool, arguments) in calls.items():
+        for state in ("cold", "warm"):
+            started = time.perf_counter()
+            output = tool.run(**arguments)
+            timings[f"{name}_{state}_s"] = round(time.perf_counter() - started, 4)
+        timings[f"{name}_output_chars"] = len(output)
+    return timings
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nChange against {baseline_path} ({baseline['meta'].get('revision')}):")
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before:
+            continue
+        for label, now, then in (
+            ("plan p50", result["plan"]["wall_s"]["p50"], before["plan"]["wall_s"]["p50"]),
+            ("llm calls", result["plan"]["llm_calls"], before["plan"]["llm_calls"]),
+            ("prompt tokens", result["plan"]["prompt_tokens"], before["plan"]["prompt_tokens"]),
+            ("tokens saved", result["plan"].get("prompt_tokens_saved", 0), before["plan"].get("prompt_tokens_saved", 0)),
+            ("peak MB", result["plan"]["peak_mb"], before["plan"]["peak_mb"]),
+        ):
+            change = f"{(now - then) / then * 100:+.1f}%" if then else "n/a"
+            print(f"  {name:14} {label:14} {then:>10} -> {now:<10} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset of the matrix")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--serpapi-latency-ms", type=float, default=0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="earlier artifact to compare with")
+    parser.add_argument("--smoke", action="store_true", help="one scenario, planned once")
+    args = parser.parse_args()
+    if args.smoke:
+        args.scenarios, args.repeat = args.scenarios.split(",")[0], 1
+
+    upstreams = StubUpstreams(args.serpapi_latency_ms / 1000, args.llm_latency_ms / 1000, args.llm_tokens_per_second)
+    with upstreams, tempfile.TemporaryDirectory() as scratch:
+        # The app reads its endpoints and cache location at import time
+        os.environ.update(upstreams.environ())
+        os.environ["TRAVEL_CACHE_PATH"] = os.path.join(scratch, "cache.sqlite3")
+        os.environ["TRAVEL_RUNS_DIR"] = os.path.join(scratch, "runs")
+        import app
+
+        results = {}
+        for scenario in args.scenarios.split(","):
+            print(f"{scenario}: planning {args.repeat}x ...", flush=True)
+            results[scenario] = {"plan": bench_plan(app, scenario, args.repeat), "tools": bench_tools(app, scenario)}
+            plan = results[scenario]["plan"]
+            print(f"  p50 {plan['wall_s']['p50']:.2f}s, warm {plan['warm_wall_s']:.2f}s, "
+                  f"{plan['llm_calls']} LLM calls, {plan['tool_calls']} tool calls, "
+                  f"{plan['prompt_tokens']} prompt tokens, "
+                  f"peak {plan['peak_mb']} MB", flush=True)
+
+        artifact = {
+            "meta": {
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "repeat": args.repeat,
+                "serpapi_latency_ms": args.serpapi_latency_ms,
+                "llm_latency_ms": args.llm_latency_ms,
+                "llm_tokens_per_second": args.llm_tokens_per_second,
+                "verification_mode": app.DEFAULT_VERIFICATION_MODE,
+                "upstream_requests": {"serpapi": upstreams.serpapi.requests, "llm": upstreams.llm.requests},
+                "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            },
+            "scenarios": results,
+        }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        compare(artifact, args.compare)
+
+    untraced = [name for name, result in results.items() if not result["plan"]["llm_calls"]]
+    if untraced:
+        print(f"No LLM spans were recorded for {', '.join(untraced)}, the LLM instrumentation is broken")
+        return 1
+    # The stub LLM calls the flight and hotel tools, a plan without tool calls didn't take the real path
+    toolless = [name for name, result in results.items() if not result["plan"]["tool_calls"]]
+    if toolless:
+        print(f"No tool calls were recorded for {', '.join(toolless)}, the agents never searched")
+        return 1
+    # The stub answers with native tool calls, so this covers the loop that skips step_callback
+    unreported = [name for name, result in results.items() if not result["plan"]["tool_call_events"]]
+    if unreported:
+        print(f"No tool_call progress events were emitted for {', '.join(unreported)}, the progress panel won't show tool use")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
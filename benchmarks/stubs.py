@@ -0,0 +1,242 @@
+"""Local stand-ins for SerpAPI and the OpenAI chat API, serving recorded responses.
+
+Both servers run in background threads of the benchmarking process and add
+a configurable latency to every response, so runs are reproducible and cost
+nothing. Point the app at them with ``SERPAPI_URL`` and ``OPENAI_BASE_URL``
+before it is imported; ``StubUpstreams.environ()`` returns those settings.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _StubServer:
+    """ThreadingHTTPServer on a free localhost port, counting the requests it served"""
+
+    def __init__(self, handler):
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(handler):
+            server_stub = stub
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SerpApiStub(_StubServer):
+    """Answers ``/search.json`` with the recorded response of the requested engine"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.responses = {
+            "google_flights": load_fixture("google_flights.json"),
+            "google_hotels": load_fixture("google_hotels.json"),
+            "google_maps": load_fixture("google_maps.json"),
+        }
+        super().__init__(self._Handler)
+
+    class _Handler(_JSONHandler):
+        def do_GET(self):
+            stub = self.server_stub
+            stub.count()
+            query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+            time.sleep(stub.latency)
+            response = stub.responses.get(query.get("engine"))
+            if response is None:
+                self.send_json(400, {"error": f"Unsupported engine: {query.get('engine')}"})
+                return
+            self.send_json(200, response)
+
+
+class OpenAIStub(_StubServer):
+    """OpenAI compatible ``/chat/completions`` that answers every task with its recorded document.
+
+    An agent offered one of the fixture's scripted tools first gets a native
+    ``tool_calls`` reply for it, with the arguments read from its prompt, so
+    the real search tools run inside the plan. Every other reply is the
+    document picked by matching the prompt against the fixture routes, as
+    plain content. ``latency`` is the time to the first token,
+    ``tokens_per_second`` paces streamed responses (0 sends everything at once).
+    """
+
+    def __init__(self, latency=0.0, tokens_per_second=0.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.fixture = load_fixture("llm_completions.json")
+        self.routes = [(re.compile(route["pattern"]), route["completion"]) for route in self.fixture["routes"]]
+        self.tool_arguments = {name: {argument: re.compile(pattern) for argument, pattern in arguments.items()}
+                               for name, arguments in self.fixture["tool_calls"].items()}
+        super().__init__(self._Handler)
+
+    def itinerary(self, days):
+        template = self.fixture["itinerary"]
+        slots = template["slots"]
+        text = template["header"]
+        for day in range(1, max(days, 1) + 1):
+            morning, afternoon, evening = slots[(day - 1) % len(slots)]
+            text += template["day"].format(day=day, morning=morning, afternoon=afternoon, evening=evening)
+        return text + template["footer"]
+
+    def document(self, name, prompt):
+        if name == "@itinerary":
+            match = re.search(r"(\d+)-day", prompt)
+            return self.itinerary(int(match.group(1)) if match else 3)
+        return self.fixture["completions"][name]
+
+    def completion(self, prompt):
+        for pattern, name in self.routes:
+            if not pattern.search(prompt):
+                continue
+            if name == "@batch":
+                answer = "\n\n".join(f"=== {section} ===\n{self.document(document, prompt)}"
+                                     for section, document in self.fixture["batch_sections"].items()
+                                     if section in prompt)
+            else:
+                answer = self.document(name, prompt)
+            return answer
+        return "No recorded completion for this prompt."
+
+    def tool_call(self, request, prompt):
+        """The scripted tool call for a request, or None once the agent has a tool result or has no such tool"""
+        messages = request.get("messages", [])
+        if any(message.get("role") == "tool" for message in messages):
+            return None
+        for tool in request.get("tools") or []:
+            name = tool["function"]["name"]
+            if name in self.tool_arguments:
+                # Typed like the tool's schema, e.g. a hotel class is a string of classes
+                properties = tool["function"].get("parameters", {}).get("properties", {})
+                arguments = {}
+                for argument, pattern in self.tool_arguments[name].items():
+                    match = pattern.search(prompt)
+                    if match:
+                        value = match.group(1).strip()
+                        types = json.dumps(properties.get(argument, {}))
+                        arguments[argument] = int(value) if value.isdigit() and '"integer"' in types else value
+                return {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                        "function": {"name": name, "arguments": json.dumps(arguments)}}
+        return None
+
+    class _Handler(_JSONHandler):
+        def do_POST(self):
+            stub = self.server_stub
+            stub.count()
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "\n".join(str(message.get("content") or "") for message in request.get("messages", []))
+            tool_call = stub.tool_call(request, prompt)
+            text = "" if tool_call else stub.completion(prompt)
+            finish_reason = "tool_calls" if tool_call else "stop"
+            model = request.get("model", "stub")
+            output = len(json.dumps(tool_call)) if tool_call else len(text)
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": output // 4,
+                     "total_tokens": (len(prompt) + output) // 4}
+            time.sleep(stub.latency)
+
+            if not request.get("stream"):
+                message = {"role": "assistant", "content": text or None}
+                if tool_call:
+                    message["tool_calls"] = [tool_call]
+                self.send_json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+                    "model": model, "usage": usage,
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            if tool_call:
+                deltas = [{"role": "assistant", "tool_calls": [{"index": 0, **tool_call}]}]
+            else:
+                deltas = [{"content": piece, **({"role": "assistant"} if index == 0 else {})}
+                          for index, piece in enumerate(re.findall(r"\S+\s*|\s+", text))]
+            for delta in deltas:
+                self._event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                if stub.tokens_per_second:
+                    time.sleep(1 / stub.tokens_per_second)
+            final = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+            if (request.get("stream_options") or {}).get("include_usage"):
+                final["usage"] = usage
+            self._event(final)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _event(self, payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+
+class StubUpstreams:
+    """Both stubs together, started and stopped as a context manager"""
+
+    def __init__(self, serpapi_latency=0.0, llm_latency=0.0, tokens_per_second=0.0):
+        self.serpapi = SerpApiStub(serpapi_latency)
+        self.llm = OpenAIStub(llm_latency, tokens_per_second)
+
+    def environ(self):
+        return {
+            "SERPAPI_URL": f"{self.serpapi.url}/search.json",
+            "OPENAI_BASE_URL": self.llm.url,
+            "OPENAI_API_BASE": self.llm.url,
+            "OPENAI_API_KEY": "stub",
+            "SERPER_API_KEY": "stub",
+            "serpapi": "stub",
+        }
+
+    def __enter__(self):
+        self.serpapi.start()
+        self.llm.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.serpapi.stop()
+        self.llm.stop()
@@ -1,11 +1,166 @@
 import os
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from crewai.tools import BaseTool
 from pydantic import  Field
-import serpapi
-from serpapi import GoogleSearch
+from pydantic.dataclasses import dataclass
+from tools.cache import TTLCache
+from tools.scheduler import emit_current
+from tools.serpapi_client import get_serpapi_client
+from tools.singleflight import coalesced
+from tools.compact import render_table
 api_key = os.getenv("serpapi")
 
+# Hotel availability changes slowly; a stale listing is served for another hour
+# while it is refreshed in the background, and old searches are evicted LRU-first
+hotel_cache = TTLCache(
+    "google_hotels",
+    ttl=int(os.getenv("HOTEL_CACHE_TTL_SECONDS", 6 * 60 * 60)),
+    stale_ttl=int(os.getenv("HOTEL_CACHE_STALE_SECONDS", 60 * 60)),
+    max_bytes=int(os.getenv("HOTEL_CACHE_MAX_BYTES", 50 * 1024 * 1024)),
+)
+
+
+def normalize_hotel_params(params: dict) -> dict:
+    """Cache identity of a search, so 'Bangkok ' and 'bangkok' or class 4 and '4' share an entry"""
+    hotel_class = params['hotel_class']
+    if hotel_class not in (None, ''):
+        hotel_class = ','.join(str(c) for c in sorted({int(c) for c in str(hotel_class).split(',') if c.strip()}))
+    return {
+        'q': ' '.join(str(params['q']).lower().split()),
+        'check_in_date': str(params['check_in_date']).strip(),
+        'check_out_date': str(params['check_out_date']).strip(),
+        'adults': int(params['adults'] or 0),
+        'children': int(params['children'] or 0),
+        'bedrooms': int(params['bedrooms'] or 0),
+        'rating': int(params['rating']) if params['rating'] not in (None, '') else None,
+        'hotel_class': hotel_class or None,
+        'currency': str(params['currency']).upper(),
+        'hl': params['hl'],
+        'gl': params['gl'],
+    }
+
+
+# What the agent gets to see: the best ranked hotels within a token budget
+HOTEL_RESULT_FIELDS = tuple(os.getenv(
+    "HOTEL_RESULT_FIELDS", "name,hotel_class,rating,reviews,price_per_night,amenities").split(","))
+HOTEL_RESULT_TOP_N = int(os.getenv("HOTEL_RESULT_TOP_N", 6))
+HOTEL_RESULT_TOKEN_BUDGET = int(os.getenv("HOTEL_RESULT_TOKEN_BUDGET", 500))
+HOTEL_RESULT_AMENITIES = 4
+
+# Google Hotels rating filter codes and the guest rating they stand for
+MIN_RATING_BY_CODE = {7: 3.5, 8: 4.0, 9: 4.5}
+
+
+@dataclass(frozen=True, slots=True)
+class HotelOption:
+    """Compact view of one Google Hotels property, without images, nearby places or tokens.
+
+    Like FlightOption it is the structured result the UI tables are built from.
+    """
+    name: str
+    hotel_class: Optional[int]
+    rating: Optional[float]
+    reviews: Optional[int]
+    price_per_night: Optional[int]
+    total_price: Optional[int]
+    amenities: Tuple[str, ...]
+
+    @classmethod
+    def from_serpapi(cls, prop: dict) -> "HotelOption":
+        return cls(
+            name=prop.get('name') or "-",
+            hotel_class=prop.get('extracted_hotel_class'),
+            rating=prop.get('overall_rating'),
+            reviews=prop.get('reviews'),
+            price_per_night=(prop.get('rate_per_night') or {}).get('extracted_lowest'),
+            total_price=(prop.get('total_rate') or {}).get('extracted_lowest'),
+            amenities=tuple((prop.get('amenities') or [])[:HOTEL_RESULT_AMENITIES]),
+        )
+
+
+def filter_hotels(hotels, max_price_per_night=None, min_class=None, min_rating=None):
+    """Drop hotels outside the budget, below the class or below the guest rating; unknown values pass"""
+    return [
+        hotel for hotel in hotels
+        if (max_price_per_night is None or hotel.price_per_night is None or hotel.price_per_night <= max_price_per_night)
+        and (min_class is None or hotel.hotel_class is None or hotel.hotel_class >= min_class)
+        and (min_rating is None or hotel.rating is None or hotel.rating >= min_rating)
+    ]
+
+
+def rank_hotels(hotels):
+    """Order by value: guest rating and price relative to the cheapest option weigh equally.
+
+    Ties are broken by price and then name so the same results always rank the same way.
+    """
+    prices = [hotel.price_per_night for hotel in hotels if hotel.price_per_night]
+    cheapest = min(prices) if prices else None
+
+    def score(hotel):
+        rating_score = (hotel.rating or 0) / 5
+        price_score = cheapest / hotel.price_per_night if cheapest and hotel.price_per_night else 0
+        return 0.5 * rating_score + 0.5 * price_score
+
+    return sorted(hotels, key=lambda hotel: (-score(hotel), hotel.price_per_night or float("inf"), hotel.name))
+
+
+HOTEL_FORMATTERS = {
+    'hotel_class': lambda stars: f"{stars}*" if stars else "-",
+    'amenities': lambda amenities: ", ".join(amenities) or "-",
+}
+
+
+def hotel_options(properties, max_price_per_night=None, min_class=None, min_rating=None) -> List[HotelOption]:
+    """Raw ``properties`` as filtered HotelOption records, best value first"""
+    return rank_hotels(filter_hotels([HotelOption.from_serpapi(prop) for prop in properties],
+                                     max_price_per_night, min_class, min_rating))
+
+
+def compact_hotels(properties, max_price_per_night=None, min_class=None, min_rating=None,
+                   fields=HOTEL_RESULT_FIELDS, top_n=HOTEL_RESULT_TOP_N,
+                   token_budget=HOTEL_RESULT_TOKEN_BUDGET, ranked=None) -> str:
+    """Filter, rank and project raw ``properties`` into a short table for the agent.
+
+    Pass ``ranked`` instead to render options already returned by ``hotel_options``.
+    """
+    hotels = ranked if ranked is not None else hotel_options(properties, max_price_per_night, min_class, min_rating)
+    if not hotels:
+        return "No hotels match this search and budget."
+    return render_table(hotels[:top_n], fields, token_budget, HOTEL_FORMATTERS)
+
+
+def hotel_search_params(q, check_in_date, check_out_date, adults=2, children=0, rooms=0,
+                        rating=8, hotel_class=4) -> dict:
+    """SerpAPI Google Hotels request for one stay"""
+    return {
+        'api_key': os.environ.get('serpapi'),
+        'engine': 'google_hotels',
+        'hl': 'en',
+        'gl': 'us',
+        'q': q,
+        'check_in_date': check_in_date,
+        'check_out_date': check_out_date,
+        'currency': 'INR',
+        'adults': adults,
+        'children': children,
+        'bedrooms': rooms,
+        'rating':rating,
+        'hotel_class':hotel_class ,
+    }
+
+
+def search_hotels(params: dict):
+    """Raw ``properties`` of a search, served from hotel_cache when possible"""
+    def search():
+        return get_serpapi_client().search(params)['properties']
+    return hotel_cache.get_or_fetch(normalize_hotel_params(params), search)
+
+
+def _min_hotel_class(hotel_class):
+    classes = [int(c) for c in str(hotel_class or '').split(',') if c.strip().isdigit()]
+    return min(classes) if classes else None
+
+
 class HotelsFinderTool(BaseTool):
     name: str = "Hotels Finder"
     description: str = "Find hotels using the Google Hotels engine."
@@ -19,7 +174,8 @@ class HotelsFinderTool(BaseTool):
             children: Optional[int] = Field(default=0, description='Number of children. Default to 0.'),
             rooms: Optional[int] = Field(default=0, description='Number of rooms. Default to 1.'),
             rating:Optional[int]=Field(default=8,description='Parameter is used for filtering the results to certain rating.'),
-            hotel_class: Optional[str] = Field(default=4,description='Parameter defines to include only certain hotel class in the results. for example- 2,3,4')) -> str:
+            hotel_class: Optional[str] = Field(default=4,description='Parameter defines to include only certain hotel class in the results. for example- 2,3,4'),
+            max_price_per_night: Optional[int] = Field(default=None, description='Maximum price per night in INR. Hotels above it are left out.')) -> str:
         """
         Search for hotels based on provided parameters
         
@@ -32,32 +188,31 @@ class HotelsFinderTool(BaseTool):
             children (Optional[int]): Number of children. Defaults to 0
             rooms (Optional[int]): Number of rooms. Defaults to 1
             hotel_class (Optional[str]): Preferred hotel class/rating. Defaults to None
+            max_price_per_night (Optional[int]): Nightly budget in INR. Defaults to no limit
         
         Returns:
             str: Hotel search results
         """
-        # Remove None values from params to avoid validation issuess
-        params = {
-        'api_key': os.environ.get('serpapi'),
-        'engine': 'google_hotels',
-        'hl': 'en',
-        'gl': 'us',
-        'q': q,
-        'check_in_date': check_in_date,
-        'check_out_date': check_out_date,
-        'currency': 'INR',
-        'adults': adults,
-        'children': children,
-        'bedrooms': rooms,
-        'rating':rating,
-        'hotel_class':hotel_class ,
-        }
+        results, options = self._search(q, check_in_date, check_out_date, adults, children, rooms, rating,
+                                         hotel_class, max_price_per_night)
+        # The plan's hotel table is built from exactly what the agent was shown, not from a second search
+        if options:
+            emit_current("search_results", ("hotels", options))
+        return results
+
+    @coalesced
+    def _search(self, q, check_in_date, check_out_date, adults, children, rooms, rating, hotel_class,
+                max_price_per_night) -> Tuple[str, List[HotelOption]]:
+        """The agent's result text and every ranked option behind it"""
+        params = hotel_search_params(q, check_in_date, check_out_date, adults, children, rooms, rating, hotel_class)
+
+        options = []
         try:
-            search = GoogleSearch(params)
-            results = search.get_dict()
-            results = results['properties']
+            options = hotel_options(search_hotels(params), max_price_per_night=max_price_per_night,
+                                    min_class=_min_hotel_class(hotel_class),
+                                    min_rating=MIN_RATING_BY_CODE.get(rating))
+            results = compact_hotels(None, ranked=options)
         except Exception as e:
             results = str(e)
 
-        return results
-    
+        return results, options
@@ -0,0 +1,24 @@
+import re
+from typing import List
+
+# A code is three capitals or digits standing on its own, so neither the
+# inside of "Hyderabad" nor words such as "New" or "San" are taken for airports
+AIRPORT_CODE = re.compile(r"\b[A-Z0-9]{3}\b")
+
+# Nothing but three character tokens and separators, such as 'hyd, blr'
+CODE_LIST = re.compile(r"[\s,;/|]*(?:[A-Za-z0-9]{3}[\s,;/|]*)+")
+
+
+def airport_codes(value) -> List[str]:
+    """IATA codes in a free-form airport set such as 'HYD, BLR' or 'LHR/LGW', in order, without repeats.
+
+    Codes are matched case-sensitively, except in a bare list of codes typed in lower case.
+    """
+    value = str(value or '')
+    if CODE_LIST.fullmatch(value):
+        value = value.upper()
+    codes = []
+    for code in AIRPORT_CODE.findall(value):
+        if code not in codes:
+            codes.append(code)
+    return codes
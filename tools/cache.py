@@ -0,0 +1,257 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from tools.tracing import record
+
+# One SQLite file holds every cache namespace. app.py swaps in pysqlite3 as
+# ``sqlite3`` before this module is imported, so it works on the Space too.
+CACHE_PATH = os.getenv("TRAVEL_CACHE_PATH", os.path.join(".cache", "travel_cache.sqlite3"))
+
+# Seconds a hit may leave an entry's last access time untouched
+LAST_ACCESS_RESOLUTION = 60
+
+
+def cache_key(params: Dict[str, Any]) -> str:
+    """Content address of a normalized parameter dict: same params, same key"""
+    payload = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Persistent key/value cache with a per-namespace time to live.
+
+    Values must be JSON serializable. Lookups and stores are thread safe and
+    the hit/miss counters are kept per instance for reporting.
+
+    ``max_bytes`` bounds the stored size of the namespace; once exceeded the
+    least recently used entries are evicted. With ``stale_ttl`` an expired
+    entry is still served for that many extra seconds by ``get_or_fetch``
+    while a background refresh replaces it (stale-while-revalidate). Entries
+    past both are deleted whenever the namespace is written to.
+    """
+
+    def __init__(self, namespace: str, ttl: float, path: str = CACHE_PATH,
+                 max_bytes: Optional[int] = None, stale_ttl: float = 0):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            # Columns added for LRU eviction; older cache files are upgraded in place
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(cache)")}
+            if "last_access" not in columns:
+                self._conn.execute("ALTER TABLE cache ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+            if "size" not in columns:
+                self._conn.execute("ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def _lookup(self, key: str):
+        """Return ``(value, age)`` of an entry regardless of freshness, or ``(None, None)``"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, created_at, last_access FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None:
+            return None, None
+        now = time.time()
+        # Access times only order LRU eviction, and a minute's precision is plenty for that
+        if self.max_bytes is not None and now - row[2] > LAST_ACCESS_RESOLUTION:
+            conn.execute(
+                "UPDATE cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            conn.commit()
+        return json.loads(row[0]), now - row[1]
+
+    def get(self, key: str):
+        """Return ``(True, value)`` for a fresh entry and ``(False, None)`` otherwise"""
+        with self._lock:
+            value, age = self._lookup(key)
+            if age is None or age > self.ttl:
+                self.misses += 1
+                record("cache_misses")
+                return False, None
+            self.hits += 1
+            record("cache_hits")
+            return True, value
+
+    def set(self, key: str, value: Any):
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, last_access, size)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, payload, now, now, len(payload)),
+            )
+            # Nothing reads an entry past its stale window again, so it only takes up space
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND created_at < ?",
+                         (self.namespace, now - self.ttl - self.stale_ttl))
+            if self.max_bytes is not None:
+                self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+            "SELECT key, size FROM cache WHERE namespace = ? ORDER BY last_access", (self.namespace,)
+        ).fetchall():
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_or_fetch(self, params: Dict[str, Any], fetch: Callable[[], Any]):
+        """Return the cached value for ``params`` or call ``fetch`` and store its result.
+
+        Exceptions from ``fetch`` propagate and nothing is cached for them.
+        """
+        key = cache_key(params)
+        with self._lock:
+            value, age = self._lookup(key)
+            if age is not None and age <= self.ttl:
+                self.hits += 1
+                record("cache_hits")
+                return value
+            if age is not None and age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                record("cache_stale_hits")
+                self._refresh_in_background(key, fetch)
+                return value
+            self.misses += 1
+            record("cache_misses")
+
+        value = fetch()
+        self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key, fetch):
+        # Called with the lock held; one refresh per key is enough
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, fetch())
+            except Exception as e:
+                logging.warning(f"Background refresh of {self.namespace} cache entry failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"{self.namespace}-refresh", daemon=True).start()
+
+    def invalidate(self, key: str = None):
+        """Drop one entry, or the whole namespace when ``key`` is omitted"""
+        with self._lock:
+            conn = self._connection()
+            if key is None:
+                conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+            else:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.stale_hits) / total if total else 0.0,
+        }
+
+
+class PlanCache:
+    """Final plan documents keyed on the trip parameters, with a separate TTL per section.
+
+    Each section lives in its own TTLCache namespace so flight options can
+    expire long before a destination guide for the same trip does. The
+    search records a section was written from, the rows of its tables and
+    charts in the UI, are kept next to it with the same TTL. ``max_bytes``
+    bounds each of these namespaces on its own.
+    """
+
+    def __init__(self, ttls: Dict[str, float], path: str = CACHE_PATH, max_bytes: Optional[int] = None):
+        self.sections = {section: TTLCache(f"plan:{section}", ttl, path, max_bytes)
+                         for section, ttl in ttls.items()}
+        self.records = {section: TTLCache(f"plan:{section}:records", ttl, path, max_bytes)
+                        for section, ttl in ttls.items()}
+
+    def get(self, params: Dict[str, Any]) -> Dict[str, str]:
+        """Return the still fresh documents for ``params``, keyed by section"""
+        key = cache_key(params)
+        documents = {}
+        for section, cache in self.sections.items():
+            hit, content = cache.get(key)
+            if hit:
+                documents[section] = content
+        return documents
+
+    def get_records(self, params: Dict[str, Any], sections) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        """Return the stored search records of ``sections`` for ``params``, keyed by section and kind of search"""
+        key = cache_key(params)
+        records = {}
+        for section in sections:
+            hit, rows = self.records[section].get(key)
+            if hit:
+                records[section] = rows
+        return records
+
+    def set(self, params: Dict[str, Any], documents: Dict[str, str],
+            records: Optional[Dict[str, Dict[str, List[Dict[str, Any]]]]] = None):
+        key = cache_key(params)
+        for section, content in documents.items():
+            if section in self.sections:
+                self.sections[section].set(key, content)
+                self.records[section].set(key, (records or {}).get(section, {}))
+
+    def invalidate(self, params: Dict[str, Any] = None, sections=None):
+        """Drop ``sections`` (default: all) for one trip, or for every trip when ``params`` is omitted"""
+        key = cache_key(params) if params is not None else None
+        for section in sections or self.sections:
+            self.sections[section].invalidate(key)
+            self.records[section].invalidate(key)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {section: cache.stats() for section, cache in self.sections.items()}
@@ -0,0 +1,37 @@
+from typing import Callable, Dict, Iterable, Sequence
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, roughly four characters per token for English text"""
+    return (len(text) + 3) // 4
+
+
+def format_minutes(minutes) -> str:
+    if minutes is None:
+        return "-"
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}h{minutes:02d}m"
+
+
+def render_table(records: Iterable, fields: Sequence[str], token_budget: int,
+                 formatters: Dict[str, Callable] = None) -> str:
+    """Render records as a pipe separated table with only ``fields``.
+
+    Rows are appended in order until the next one would push the table past
+    ``token_budget``; the header is always kept so the agent knows the columns.
+    """
+    formatters = formatters or {}
+    lines = [" | ".join(fields)]
+    used = estimate_tokens(lines[0])
+    for record in records:
+        cells = []
+        for name in fields:
+            value = getattr(record, name)
+            cells.append(formatters[name](value) if name in formatters else ("-" if value is None else str(value)))
+        line = " | ".join(cells)
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
@@ -1,55 +1,314 @@
 import os
-from typing import Optional
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
 from crewai.tools import BaseTool
-import serpapi
 from pydantic import  Field
-from serpapi import GoogleSearch
+from pydantic.dataclasses import dataclass
+from tools.airports import airport_codes
+from tools.cache import TTLCache, cache_key
+from tools.scheduler import emit_current
+from tools.serpapi_client import get_serpapi_client
+from tools.singleflight import coalesced
+from tools.compact import format_minutes, render_table
 api_key = os.getenv("serpapi")
 
+# Fares move during the day, so flight responses are only reused for a short while
+flight_cache = TTLCache("google_flights", ttl=int(os.getenv("FLIGHT_CACHE_TTL_SECONDS", 60 * 60)),
+                        max_bytes=int(os.getenv("FLIGHT_CACHE_MAX_BYTES", 50 * 1024 * 1024)))
+
+
+def normalize_flight_params(params: dict) -> dict:
+    """Cache identity of a search: route, dates, passengers, stops and currency, never the api key"""
+    return {
+        'departure_id': str(params['departure_id']).strip().upper(),
+        'arrival_id': str(params['arrival_id']).strip().upper(),
+        'outbound_date': str(params['outbound_date']).strip(),
+        'return_date': str(params['return_date'] or '').strip(),
+        'adults': int(params['adults'] or 0),
+        'children': int(params['children'] or 0),
+        'infants_in_seat': int(params['infants_in_seat'] or 0),
+        'infants_on_lap': int(params['infants_on_lap'] or 0),
+        'stops': int(params['stops'] or 0),
+        'currency': str(params['currency']).upper(),
+        'hl': params['hl'],
+        'gl': params['gl'],
+    }
+
+
+def flight_search_params(departure_airport, arrival_airport, outbound_date, return_date,
+                         adults=1, children=0, infants_in_seat=0, infants_on_lap=0, stops=0) -> dict:
+    """SerpAPI Google Flights request for one route and date pair"""
+    return {
+        'engine': 'google_flights',
+        'departure_id': departure_airport,
+        'arrival_id': arrival_airport,
+        'outbound_date': outbound_date,
+        'return_date': return_date,
+        'currency': 'INR',
+        'adults': adults,
+        'children': children,
+        'infants_in_seat': infants_in_seat,
+        'infants_on_lap': infants_on_lap,
+        'stops':stops,
+        'hl': 'en',
+        'gl': 'us',
+        'api_key': api_key
+    }
+
+
+# Upper bound on origin x destination combinations one tool call may search
+FLIGHT_MAX_ROUTES = int(os.getenv("FLIGHT_MAX_ROUTES", 9))
+
+
+def route_search_params(departure_airports, arrival_airports, outbound_date, return_date, **passengers) -> List[dict]:
+    """One search per origin x destination pair of two airport sets, at most FLIGHT_MAX_ROUTES of them"""
+    routes = [(origin, destination)
+              for origin in airport_codes(departure_airports)
+              for destination in airport_codes(arrival_airports) if origin != destination]
+    if not routes:
+        raise ValueError("No valid departure and arrival airport codes were given")
+    return [flight_search_params(origin, destination, outbound_date, return_date, **passengers)
+            for origin, destination in routes[:FLIGHT_MAX_ROUTES]]
+
+
+def search_flights(params_list) -> List:
+    """``best_flights`` of several searches; each result is a list or the exception its search raised.
+
+    Searches are deduplicated on their cache identity, cached ones are not
+    sent at all and the rest go out concurrently through the shared client.
+    """
+    keys = [cache_key(normalize_flight_params(params)) for params in params_list]
+    results = {}
+    pending = {}
+    for key, params in zip(keys, params_list):
+        if key in results or key in pending:
+            continue
+        hit, value = flight_cache.get(key)
+        if hit:
+            results[key] = value
+        else:
+            pending[key] = params
+
+    if pending:
+        responses = get_serpapi_client().search_many(list(pending.values()))
+        for key, response in zip(pending, responses):
+            if isinstance(response, Exception):
+                results[key] = response
+            else:
+                results[key] = response.get('best_flights') or []
+                flight_cache.set(key, results[key])
+    return [results[key] for key in keys]
+
+
+# Flexible dates: how many days either date may move, each extra day widens the matrix by one row and column
+FLIGHT_FLEX_DAYS_MAX = int(os.getenv("FLIGHT_FLEX_DAYS_MAX", 3))
+
+# Upper bound on the searches of one fare matrix, routes x date pairs; three days of flexibility
+# on a 3x3 airport set would otherwise send 441
+FLIGHT_MAX_SEARCHES = int(os.getenv("FLIGHT_MAX_SEARCHES", 60))
+
+
+def flexible_date_pairs(outbound_date: str, return_date: Optional[str], flex_days: int) -> List[Tuple[str, str]]:
+    """Every (outbound, return) pair within +-flex_days of the requested dates, never returning before leaving"""
+    def shifted(day):
+        start = date.fromisoformat(day)
+        return [(start + timedelta(days=offset)).isoformat() for offset in range(-flex_days, flex_days + 1)]
+
+    outbound_dates = shifted(outbound_date)
+    if not return_date:
+        return [(outbound, '') for outbound in outbound_dates]
+    return [(outbound, inbound) for outbound in outbound_dates for inbound in shifted(return_date)
+            if inbound >= outbound]
+
+
+def price_matrix(routes: List[dict], flex_days: int,
+                 max_searches: int = FLIGHT_MAX_SEARCHES) -> Dict[Tuple[str, str], Optional[int]]:
+    """Cheapest fare over ``routes`` for every date pair around their dates.
+
+    None where every search failed or found nothing. The routes share their
+    dates, so the first one decides the window. To stay within
+    ``max_searches`` the matrix covers only the first routes, and with a
+    single route still too many, a narrower window. Empty when no pair is
+    possible, such as a return date before the outbound date.
+    """
+    flex_days = max(0, flex_days)
+    pairs = flexible_date_pairs(routes[0]['outbound_date'], routes[0]['return_date'], flex_days)
+    while flex_days and len(pairs) > max_searches:
+        flex_days -= 1
+        pairs = flexible_date_pairs(routes[0]['outbound_date'], routes[0]['return_date'], flex_days)
+    if not pairs:
+        return {}
+    routes = routes[:max(1, max_searches // len(pairs))]
+    searches = [dict(params, outbound_date=outbound, return_date=inbound)
+                for outbound, inbound in pairs for params in routes]
+    results = search_flights(searches)
+    matrix = {}
+    for index, pair in enumerate(pairs):
+        prices = [item['price']
+                  for itineraries in results[index * len(routes):(index + 1) * len(routes)]
+                  if not isinstance(itineraries, Exception)
+                  for item in itineraries if item.get('price') is not None]
+        matrix[pair] = min(prices) if prices else None
+    return matrix
+
+
+def fare_rows(matrix: Dict[Tuple[str, str], Optional[int]]) -> List[dict]:
+    """A price matrix as JSON ready rows of outbound date, return date and cheapest fare"""
+    return [{"outbound": outbound, "return": inbound, "price": price}
+            for (outbound, inbound), price in sorted(matrix.items())]
+
+
+def render_price_matrix(matrix: Dict[Tuple[str, str], Optional[int]]) -> str:
+    """Outbound dates as rows, return dates as columns, cheapest fare in the cells"""
+    outbound_dates = sorted({outbound for outbound, _ in matrix})
+    return_dates = sorted({inbound for _, inbound in matrix})
+    lines = ["out \\ back | " + " | ".join(day[5:] or "one way" for day in return_dates)]
+    for outbound in outbound_dates:
+        cells = [matrix.get((outbound, inbound)) for inbound in return_dates]
+        lines.append(outbound[5:] + " | " + " | ".join("-" if price is None else str(price) for price in cells))
+    return "\n".join(lines)
+
+
+# What the agent gets to see: a few columns of the cheapest options, within a token budget
+FLIGHT_RESULT_FIELDS = tuple(os.getenv(
+    "FLIGHT_RESULT_FIELDS", "airline,flight_numbers,departure,arrival,duration,stops,price").split(","))
+FLIGHT_RESULT_TOP_N = int(os.getenv("FLIGHT_RESULT_TOP_N", 5))
+FLIGHT_RESULT_TOKEN_BUDGET = int(os.getenv("FLIGHT_RESULT_TOKEN_BUDGET", 400))
+
+
+@dataclass(frozen=True, slots=True)
+class FlightOption:
+    """Compact view of one SerpAPI itinerary, without logos, tokens or carbon data.
+
+    A validated pydantic dataclass: the tool renders it for the agent and the
+    UI builds its sortable flight table from the same records.
+    """
+    airline: str
+    flight_numbers: Tuple[str, ...]
+    departure: str
+    arrival: str
+    duration: Optional[int]
+    stops: int
+    price: Optional[int]
+
+    @classmethod
+    def from_serpapi(cls, itinerary: dict) -> "FlightOption":
+        legs = itinerary.get('flights') or [{}]
+        first, last = legs[0], legs[-1]
+        airlines = []
+        for leg in legs:
+            if leg.get('airline') and leg['airline'] not in airlines:
+                airlines.append(leg['airline'])
+        return cls(
+            airline="/".join(airlines) or "-",
+            flight_numbers=tuple(leg['flight_number'] for leg in legs if leg.get('flight_number')),
+            departure=" ".join(filter(None, [first.get('departure_airport', {}).get('id'),
+                                             first.get('departure_airport', {}).get('time')])),
+            arrival=" ".join(filter(None, [last.get('arrival_airport', {}).get('id'),
+                                           last.get('arrival_airport', {}).get('time')])),
+            duration=itinerary.get('total_duration'),
+            stops=len(legs) - 1,
+            price=itinerary.get('price'),
+        )
+
+    def sort_key(self):
+        # Cheapest first, unknown prices last, then the shortest trip
+        return (self.price is None, self.price or 0, self.duration or 0)
+
+
+FLIGHT_FORMATTERS = {
+    'flight_numbers': lambda numbers: ", ".join(numbers) or "-",
+    'duration': format_minutes,
+}
+
+
+def merge_flights(itinerary_lists) -> List[FlightOption]:
+    """One price-sorted list from the ``best_flights`` of several searches.
+
+    Itineraries flying the same flight numbers are the same trip, whichever
+    search found them; only the cheapest of them is kept.
+    """
+    best = {}
+    for itineraries in itinerary_lists:
+        for item in itineraries:
+            option = FlightOption.from_serpapi(item)
+            key = option.flight_numbers or option
+            if key not in best or option.sort_key() < best[key].sort_key():
+                best[key] = option
+    return sorted(best.values(), key=FlightOption.sort_key)
+
+
+def compact_flights(itineraries, fields=FLIGHT_RESULT_FIELDS, top_n=FLIGHT_RESULT_TOP_N,
+                    token_budget=FLIGHT_RESULT_TOKEN_BUDGET, merged=None) -> str:
+    """Project raw ``best_flights`` into a short, price-sorted table for the agent.
+
+    Pass ``merged`` instead to render options already combined by ``merge_flights``.
+    """
+    options = merged if merged is not None else merge_flights([itineraries])
+    if not options:
+        return "No flights found for this search."
+    return render_table(options[:top_n], fields, token_budget, FLIGHT_FORMATTERS)
+
 
 
 class FlightsFinderTool(BaseTool):
 
     name: str = "Flights Finder"
-    description: str = "Find flights using the Google Flights engine"
+    description: str = ("Find flights using the Google Flights engine. Departure and arrival accept several "
+                        "nearby airports at once, comma separated (e.g. 'HYD, BLR'); all combinations are "
+                        "searched and merged into one list.")
 
     
     def _run(
         self, 
-        departure_airport: Optional[str] = Field(description='Departure airport code (IATA)'),
-        arrival_airport: Optional[str] = Field(description='Arrival airport code (IATA)'),
+        departure_airport: Optional[str] = Field(description='Departure airport code (IATA), or several comma separated'),
+        arrival_airport: Optional[str] = Field(description='Arrival airport code (IATA), or several comma separated'),
         outbound_date: Optional[str] = Field(description='Outbound date in YYYY-MM-DD format'),
         return_date: Optional[str] = Field(description='Return date in YYYY-MM-DD format'),
         adults: int = 1,  # Default to 1
         children: int = 0,  # Defaultt to 0
         infants_in_seat: int = 0,  # Default to 0
         infants_on_lap: int = 0,  # Default to 0
-        stops:int=0
-    ) -> dict:
-
-        params = {
-            'engine': 'google_flights',
-            'departure_id': departure_airport,
-            'arrival_id': arrival_airport,
-            'outbound_date': outbound_date,
-            'return_date': return_date,
-            'currency': 'INR',
-            'adults': adults,
-            'children': children,
-            'infants_in_seat': infants_in_seat,
-            'infants_on_lap': infants_on_lap,
-            'stops':stops,
-            'hl': 'en',
-            'gl': 'us',
-            'api_key': api_key
-        }
-        
+        stops:int=0,
+        flex_days: int = 0  # Search dates up to this many days earlier or later too
+    ) -> str:
+        results, options, fares = self._search(departure_airport, arrival_airport, outbound_date, return_date,
+                                                adults, children, infants_in_seat, infants_on_lap, stops, flex_days)
+        # The plan's flight table and fare heatmap are built from exactly what the agent was shown,
+        # not from a second search
+        if options:
+            emit_current("search_results", ("flights", options))
+        if fares:
+            emit_current("search_results", ("fares", fares))
+        return results
+
+    @coalesced
+    def _search(self, departure_airport, arrival_airport, outbound_date, return_date, adults, children,
+                infants_in_seat, infants_on_lap, stops, flex_days) -> Tuple[str, List[FlightOption], List[dict]]:
+        """The agent's result text, every merged option behind it and the fare matrix as ``fare_rows``"""
+        options, fares = [], []
         try:
-            search = GoogleSearch(params)
-            results = search.get_dict()
-            results = results['best_flights']
+            routes = route_search_params(departure_airport, arrival_airport, outbound_date, return_date,
+                                         adults=adults, children=children, infants_in_seat=infants_in_seat,
+                                         infants_on_lap=infants_on_lap, stops=stops)
+            # Every route at once; the requested dates are part of the flexible window anyway
+            matrix = price_matrix(routes, min(int(flex_days), FLIGHT_FLEX_DAYS_MAX)) if flex_days else None
+            found = search_flights(routes)
+
+            failed = [(params, result) for params, result in zip(routes, found) if isinstance(result, Exception)]
+            if len(failed) == len(routes):
+                raise failed[0][1]
+            options = merge_flights(result for result in found if not isinstance(result, Exception))
+            results = compact_flights(None, merged=options)
+            if failed:
+                results += "\n\nSearch failed for: " + ", ".join(
+                    f"{params['departure_id']}-{params['arrival_id']} ({error})" for params, error in failed)
+            if matrix:
+                fares = fare_rows(matrix)
+                results = ("Cheapest fare in INR by outbound (rows) and return (columns) date:\n"
+                           + render_price_matrix(matrix)
+                           + "\n\nBest flights on the requested dates:\n" + results)
         except Exception as e:
             results = str(e)
 
-        return results
-    
+        return results, options, fares
@@ -0,0 +1,324 @@
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from tools.cache import TTLCache, cache_key
+
+# Places and their opening hours change rarely, a week old search is still good
+attraction_cache = TTLCache("google_maps", ttl=int(os.getenv("ATTRACTION_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60)),
+                            max_bytes=int(os.getenv("ATTRACTION_CACHE_MAX_BYTES", 20 * 1024 * 1024)))
+
+# Searches per plan: the top sights plus one per stated preference
+ATTRACTION_MAX_QUERIES = int(os.getenv("ATTRACTION_MAX_QUERIES", 5))
+
+# Day window in minutes after midnight; children get a shorter day and a rest after lunch
+DAY_START = 9 * 60
+DAY_END = 20 * 60
+FAMILY_DAY_END = 19 * 60
+ARRIVAL_DAY_START = 14 * 60
+LUNCH = (12 * 60 + 30, 13 * 60 + 30)
+CHILD_REST = (13 * 60 + 30, 15 * 60)
+DINNER = (18 * 60 + 30, 19 * 60 + 45)
+FAMILY_DINNER = (17 * 60 + 45, 19 * 60)
+
+# Most activities a day, a family day is kept lighter
+MAX_ACTIVITIES = 4
+FAMILY_MAX_ACTIVITIES = 3
+
+# Estimated entry costs per person and day, in INR like the flight and hotel prices
+ACTIVITY_BUDGETS = {"budget": 1500, "mid-range": 4000, "luxury": 10000}
+
+# Door to door speed in the city and the fixed cost of every transfer
+CITY_SPEED_KMH = float(os.getenv("ITINERARY_CITY_SPEED_KMH", 18))
+TRANSFER_OVERHEAD_MINUTES = 10
+FIRST_TRANSFER_MINUTES = 30
+
+# Longest wait for a place to open before it is skipped for now
+MAX_WAIT_MINUTES = 30
+
+# Assumed when Google Maps has no opening hours for a place
+DEFAULT_HOURS = ((9 * 60, 18 * 60),)
+
+# Place types to visit length in minutes and estimated entry cost per person; first match wins
+PLACE_PROFILES = (
+    (("theme park", "amusement", "water park", "zoo", "aquarium", "safari"), 180, 2500),
+    (("museum", "gallery", "palace"), 120, 800),
+    (("market", "mall", "shopping"), 120, 0),
+    (("temple", "shrine", "church", "mosque", "cathedral", "wat"), 75, 300),
+    (("park", "garden", "beach", "viewpoint", "nature", "lake"), 90, 0),
+)
+DEFAULT_PROFILE = (90, 500)
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+TIME = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*([AP]M)?", re.IGNORECASE)
+
+
+def format_clock(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_hours(text: Optional[str]) -> Optional[Tuple[Tuple[int, int], ...]]:
+    """Opening ranges of one day as minutes, e.g. '11 AM–2 PM, 5–10 PM'; () when closed, None when unreadable"""
+    if not text:
+        return None
+    text = text.replace("\u202f", " ").replace("\xa0", " ").strip()
+    if text.lower().startswith("closed"):
+        return ()
+    if "24 hours" in text.lower():
+        return ((0, 24 * 60),)
+    ranges = []
+    for part in text.split(","):
+        ends = re.split(r"\s*[–-]\s*", part.strip())
+        if len(ends) != 2:
+            return None
+        start, end = TIME.fullmatch(ends[0]), TIME.fullmatch(ends[1])
+        if not start or not end:
+            return None
+        # '5–10 PM' leaves the meridiem of the opening time to the closing time
+        start_meridiem = start.group(3) or end.group(3)
+        opens = _minutes(start.group(1), start.group(2), start_meridiem)
+        closes = _minutes(end.group(1), end.group(2), end.group(3))
+        if closes <= opens:
+            closes += 24 * 60
+        ranges.append((opens, min(closes, 24 * 60)))
+    return tuple(ranges)
+
+
+def _minutes(hour, minute, meridiem):
+    hour = int(hour) % 12 if meridiem else int(hour)
+    if meridiem and meridiem.upper() == "PM":
+        hour += 12
+    return hour * 60 + int(minute or 0)
+
+
+@dataclass(frozen=True)
+class Attraction:
+    """A Google Maps place worth visiting, with what scheduling needs to know about it"""
+    name: str
+    preference: str
+    kind: str
+    lat: Optional[float]
+    lng: Optional[float]
+    rating: Optional[float]
+    reviews: Optional[int]
+    visit_minutes: int
+    cost: int
+    hours: Dict[str, Optional[Tuple[Tuple[int, int], ...]]] = field(default_factory=dict)
+
+    @classmethod
+    def from_serpapi(cls, place: dict, preference: str) -> "Attraction":
+        kind = (place.get("type") or " ".join(place.get("types") or []) or "").lower()
+        visit_minutes, cost = DEFAULT_PROFILE
+        for keywords, minutes, price in PLACE_PROFILES:
+            if any(keyword in kind or keyword in (place.get("title") or "").lower() for keyword in keywords):
+                visit_minutes, cost = minutes, price
+                break
+        coordinates = place.get("gps_coordinates") or {}
+        hours = {}
+        for day in place.get("operating_hours") or {}:
+            hours[day.lower()] = parse_hours(place["operating_hours"][day])
+        return cls(
+            name=place.get("title") or "-",
+            preference=preference,
+            kind=kind or "attraction",
+            lat=coordinates.get("latitude"),
+            lng=coordinates.get("longitude"),
+            rating=place.get("rating"),
+            reviews=place.get("reviews"),
+            visit_minutes=visit_minutes,
+            cost=cost,
+            hours=hours,
+        )
+
+    def opening_ranges(self, day: date) -> Tuple[Tuple[int, int], ...]:
+        weekday = WEEKDAYS[day.weekday()]
+        if weekday in self.hours and self.hours[weekday] is not None:
+            return self.hours[weekday]
+        return DEFAULT_HOURS
+
+
+def travel_minutes(origin: Optional[Attraction], destination: Attraction) -> int:
+    """Estimated transfer time, straight line distance at city speed, rounded up to five minutes"""
+    if origin is None or None in (origin.lat, origin.lng, destination.lat, destination.lng):
+        return FIRST_TRANSFER_MINUTES
+    lat1, lng1, lat2, lng2 = map(math.radians, (origin.lat, origin.lng, destination.lat, destination.lng))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    km = 2 * 6371 * math.asin(math.sqrt(a))
+    minutes = TRANSFER_OVERHEAD_MINUTES + km / CITY_SPEED_KMH * 60
+    return int(math.ceil(minutes / 5) * 5)
+
+
+@dataclass
+class Slot:
+    start: int
+    end: int
+    kind: str  # activity, meal, rest or transfer
+    title: str
+    attraction: Optional[Attraction] = None
+    travel: int = 0
+
+
+@dataclass
+class DayPlan:
+    number: int
+    day: date
+    slots: List[Slot] = field(default_factory=list)
+
+    @property
+    def cost(self) -> int:
+        return sum(slot.attraction.cost for slot in self.slots if slot.attraction)
+
+
+@dataclass
+class Schedule:
+    days: List[DayPlan]
+    alternatives: List[Attraction]
+
+    @property
+    def activities(self) -> int:
+        return sum(1 for day in self.days for slot in day.slots if slot.kind == "activity")
+
+    def to_markdown(self) -> str:
+        """The fixed schedule the itinerary agent writes its prose for, compact on purpose"""
+        lines = []
+        for day in self.days:
+            lines.append(f"### Day {day.number} ({day.day.strftime('%a %Y-%m-%d')}, "
+                         f"est. entry costs {day.cost} INR pp)")
+            for slot in day.slots:
+                line = f"- {format_clock(slot.start)}-{format_clock(slot.end)} {slot.title}"
+                if slot.attraction:
+                    line += f" [{slot.attraction.preference}; {slot.travel} min transfer; ~{slot.attraction.cost} INR pp]"
+                lines.append(line)
+        if self.alternatives:
+            lines.append("Alternatives for bad weather or closures: "
+                         + ", ".join(attraction.name for attraction in self.alternatives))
+        return "\n".join(lines)
+
+
+def day_windows(outbound_date: str, return_date: str, children: int) -> List[Tuple[date, int, int]]:
+    """(date, start, end) of every itinerary day; the arrival day starts in the afternoon"""
+    first = date.fromisoformat(str(outbound_date))
+    days = (date.fromisoformat(str(return_date)) - first).days
+    end = FAMILY_DAY_END if children else DAY_END
+    return [(first + timedelta(days=offset), ARRIVAL_DAY_START if offset == 0 else DAY_START, end)
+            for offset in range(max(days, 1))]
+
+
+def fixed_blocks(children: int) -> List[Slot]:
+    blocks = [Slot(*LUNCH, "meal", "Lunch")]
+    if children:
+        blocks.append(Slot(*CHILD_REST, "rest", "Rest break at the hotel or a quiet spot"))
+    blocks.append(Slot(*(FAMILY_DINNER if children else DINNER), "meal", "Dinner"))
+    return blocks
+
+
+def _visit_start(attraction: Attraction, day: date, arrival: int, deadline: int) -> Optional[int]:
+    """When a visit arriving at ``arrival`` can start and still finish in opening hours and by ``deadline``"""
+    for opens, closes in attraction.opening_ranges(day):
+        start = max(arrival, opens)
+        if start - arrival <= MAX_WAIT_MINUTES and start + attraction.visit_minutes <= min(closes, deadline):
+            return start
+    return None
+
+
+def plan_schedule(attractions: Sequence[Attraction], outbound_date: str, return_date: str,
+                  children: int = 0, budget: str = "Mid-range") -> Schedule:
+    """Pack attractions into day slots around meals and rests, without any LLM.
+
+    Every stop is the nearest open attraction that fits before the next
+    fixed block, preferring preferences not served yet that day, within the
+    day's count and entry cost budget. What doesn't fit becomes alternatives.
+    """
+    remaining = sorted(attractions, key=lambda a: (-(a.rating or 0), -(a.reviews or 0), a.name))
+    day_budget = ACTIVITY_BUDGETS.get(str(budget).strip().lower(), ACTIVITY_BUDGETS["mid-range"])
+    max_activities = FAMILY_MAX_ACTIVITIES if children else MAX_ACTIVITIES
+    plans = []
+    for number, (day, start, end) in enumerate(day_windows(outbound_date, return_date, children), 1):
+        plan = DayPlan(number, day)
+        if number == 1:
+            plan.slots.append(Slot(start - 60, start, "rest", "Arrival and hotel check-in"))
+        clock, position, spent, served = start, None, 0, set()
+        for block in [*[b for b in fixed_blocks(children) if b.start >= start], Slot(end, end, "end", "")]:
+            while len(served) < max_activities and remaining:
+                options = []
+                for attraction in remaining:
+                    if spent + attraction.cost > day_budget:
+                        continue
+                    travel = travel_minutes(position, attraction)
+                    visit = _visit_start(attraction, day, clock + travel, block.start)
+                    if visit is not None:
+                        repeat = any(slot.attraction and slot.attraction.preference == attraction.preference
+                                     for slot in plan.slots)
+                        options.append(((repeat, travel, visit), attraction, travel, visit))
+                if not options:
+                    break
+                _, attraction, travel, visit = min(options, key=lambda option: option[0])
+                plan.slots.append(Slot(visit, visit + attraction.visit_minutes, "activity", attraction.name,
+                                       attraction, travel))
+                remaining.remove(attraction)
+                clock, position = visit + attraction.visit_minutes, attraction
+                spent += attraction.cost
+                served.add(attraction.name)
+            if block.kind != "end":
+                plan.slots.append(block)
+                clock = max(clock, block.end)
+        plans.append(plan)
+    return Schedule(plans, remaining[:5])
+
+
+def attraction_queries(destination: str, preferences: str) -> List[Tuple[str, str]]:
+    """(preference, Google Maps query) pairs: the top sights and one per stated preference"""
+    topics = [topic.strip() for topic in re.split(r"[,;\n]", preferences or "") if topic.strip()]
+    queries = [("top sights", f"top tourist attractions in {destination}")]
+    queries += [(topic, f"{topic} in {destination}") for topic in topics]
+    return queries[:ATTRACTION_MAX_QUERIES]
+
+
+def attraction_search_params(query: str) -> dict:
+    """SerpAPI Google Maps request for one query"""
+    return {
+        'engine': 'google_maps',
+        'type': 'search',
+        'q': query,
+        'hl': 'en',
+        'api_key': os.getenv("serpapi"),
+    }
+
+
+def search_attractions(destination: str, preferences: str) -> List[Attraction]:
+    """Candidate attractions of all queries, cached per query and deduplicated by name.
+
+    Uncached queries go out concurrently; a failed query only loses its own candidates.
+    """
+    from tools.serpapi_client import get_serpapi_client
+
+    queries = attraction_queries(destination, preferences)
+    places: Dict[str, list] = {}
+    pending = {}
+    for preference, query in queries:
+        key = cache_key({"q": " ".join(query.lower().split())})
+        hit, value = attraction_cache.get(key)
+        if hit:
+            places[preference] = value
+        else:
+            pending[key] = (preference, attraction_search_params(query))
+
+    if pending:
+        responses = get_serpapi_client().search_many([params for _, params in pending.values()])
+        for (key, (preference, _)), response in zip(pending.items(), responses):
+            if isinstance(response, Exception):
+                continue
+            places[preference] = response.get('local_results') or []
+            attraction_cache.set(key, places[preference])
+
+    attractions, seen = [], set()
+    for preference, _ in queries:
+        for place in places.get(preference, []):
+            attraction = Attraction.from_serpapi(place, preference)
+            if attraction.name.lower() not in seen:
+                seen.add(attraction.name.lower())
+                attractions.append(attraction)
+    return attractions
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+JOB_RETENTION_SECONDS = 60 * 60
+
+
+class _Channel:
+    """Stand-in for a UI object inside a job: every call on it is appended to the job log"""
+
+    def __init__(self, log: List, name: str):
+        self._log = log
+        self._name = name
+
+    def __call__(self, *args):
+        self._log.append((self._name, "__call__", args))
+
+    def __getattr__(self, method):
+        def record(*args):
+            self._log.append((self._name, method, args))
+        return record
+
+
+@dataclass
+class Job:
+    """One background run and everything it reported so far.
+
+    Streamlit elements can only be updated from the script thread, so the job
+    talks to recording channels instead. Any script run, including one that
+    started after a rerun or a page reload, can ``replay`` the log onto fresh
+    elements and then keep following it.
+    """
+    id: str
+    key: str
+    payload: Any = None
+    future: Optional[Future] = None
+    log: List[Tuple[str, str, tuple]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def channel(self, name: str) -> _Channel:
+        return _Channel(self.log, name)
+
+    def replay(self, targets: Dict[str, Any], start: int = 0) -> int:
+        """Apply log entries from ``start`` on to ``targets`` by channel name; returns where to resume"""
+        end = len(self.log)
+        for name, method, args in self.log[start:end]:
+            target = targets.get(name)
+            if target is not None:
+                getattr(target, method)(*args)
+        return end
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+
+class JobExecutor:
+    """Runs jobs on a small thread pool, detached from any one Streamlit script run.
+
+    Jobs are submitted under a key describing their work. While a job with
+    the same key is still running, submitting it again returns that job
+    instead of starting a second one. Finished jobs are kept for
+    ``retention`` seconds so their results can still be picked up.
+    """
+
+    def __init__(self, max_workers: int = 2, retention: float = JOB_RETENTION_SECONDS):
+        self.retention = retention
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plan-job")
+        self._jobs: Dict[str, Job] = {}
+        self._running: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn: Callable[[Job], Any], payload: Any = None) -> Tuple[Job, bool]:
+        """Start ``fn(job)`` unless a job for ``key`` is in flight; returns the job and whether it is new"""
+        with self._lock:
+            self._prune()
+            running = self._running.get(key)
+            if running is not None and not running.done:
+                return running, False
+
+            job = Job(id=uuid.uuid4().hex, key=key, payload=payload)
+            self._jobs[job.id] = job
+            self._running[key] = job
+            job.future = self._pool.submit(self._execute, job, fn)
+            return job, True
+
+    def _execute(self, job: Job, fn):
+        try:
+            return fn(job)
+        except Exception:
+            logging.exception(f"Background job {job.id} failed")
+            raise
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._running.get(job.key) is job:
+                    del self._running[job.key]
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        # Called with the lock held
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
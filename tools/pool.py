@@ -0,0 +1,40 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Generic, List, TypeVar
+
+T = TypeVar("T")
+
+
+class ObjectPool(Generic[T]):
+    """Thread-safe pool of expensive, reusable objects.
+
+    ``lease`` hands out an idle object, or builds a new one with ``factory``
+    when all of them are busy, and takes it back afterwards. At most
+    ``max_idle`` objects are kept around between leases, so a burst of
+    concurrent runs doesn't pin memory forever.
+    """
+
+    def __init__(self, factory: Callable[[], T], max_idle: int = 4):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle: List[T] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self):
+        with self._lock:
+            item = self._idle.pop() if self._idle else None
+            if item is not None:
+                self.reused += 1
+        if item is None:
+            item = self.factory()
+            with self._lock:
+                self.created += 1
+        try:
+            yield item
+        finally:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(item)
@@ -0,0 +1,364 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from tools.compact import estimate_tokens
+
+# House rules of every document. They go into the agents' backstories, which crewai
+# sends as the system message of every call, rather than into each task description.
+DOCUMENT_RULES = """\
+You write one part of a travel plan made of four Markdown documents: destination guide, flights,
+hotels and day-by-day itinerary. Every document has clear headings, no code fences or notes about
+your process, specific names, times and prices (estimates marked), and nothing outside its scope."""
+
+# What each kind of document may contain. The verification prompts and the batch
+# verification share these instead of each repeating its own restriction block.
+CATEGORY_SCOPES = {
+    "destination_guide": ("destination", "attractions, culture and customs, neighborhoods, local transport, safety"),
+    "flight_options": ("flight", "airlines, flight numbers, times, prices and fees, layovers, policies"),
+    "hotel_recommendations": ("hotel", "hotels, ratings, rooms and prices, locations, amenities, reviews"),
+    "itinerary_recommendations": ("itinerary", "the timed day-by-day activities, meals, transfers and their costs"),
+}
+
+# Most estimated tokens a rendered task description may use, each below the hand
+# written description it replaced on the benchmark trips. Optional details of a
+# template are dropped, last first, until the prompt fits.
+PROMPT_TOKEN_BUDGETS = {
+    "destination_research": 200,
+    "destination_knowledge": 170,
+    "destination_guide": 190,
+    "flight_research": 200,
+    "hotel_research": 220,
+    "itinerary_research": 280,
+    "itinerary_prose": 230,
+    "flight_options": 170,
+    "hotel_recommendations": 200,
+    "itinerary_recommendations": 240,
+    "verification_batch": 218,
+}
+
+
+def scope_rule(category: str) -> str:
+    """The one restriction block of a document kind, removing everything outside of it"""
+    kind, covers = CATEGORY_SCOPES[category]
+    return f"Scope: ONLY {kind} content ({covers}), remove anything else."
+
+
+def bullets(lines: Sequence[str]) -> str:
+    return "\n".join(f"- {line}" for line in lines)
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A task description: fixed instructions, then the trip details.
+
+    ``trip`` is the only part formatted with the trip's values. ``details`` are
+    the instructions that can go when the prompt is over its token budget.
+    """
+    name: str
+    instructions: str
+    trip: str
+    checklist: Sequence[str] = ()
+    details: Sequence[str] = ()
+    category: Optional[str] = None
+
+    @property
+    def budget(self) -> int:
+        return PROMPT_TOKEN_BUDGETS[self.name]
+
+    def compose(self, trip: str, details: Sequence[str]) -> str:
+        parts = [self.instructions, bullets(self.checklist), bullets(details)]
+        if self.category:
+            parts.append(scope_rule(self.category))
+        parts.append(trip)
+        return "\n\n".join(part for part in parts if part)
+
+    def render(self, **values) -> "RenderedPrompt":
+        trip = self.trip.format(**values).strip()
+        details = list(self.details)
+        text = self.compose(trip, details)
+        while estimate_tokens(text) > self.budget and details:
+            details.pop()
+            text = self.compose(trip, details)
+        tokens = estimate_tokens(text)
+        if tokens > self.budget:
+            logging.warning(f"Prompt of {self.name} uses {tokens} tokens, over its budget of {self.budget}")
+        return RenderedPrompt(self.name, text, tokens, self.budget, len(self.details) - len(details))
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    name: str
+    text: str
+    tokens: int
+    budget: int
+    dropped_details: int = 0
+
+
+TEMPLATES = {template.name: template for template in (
+    PromptTemplate(
+        name="destination_research",
+        instructions="Conduct comprehensive research on the destination below for a travel guide covering:",
+        checklist=(
+            "Top attractions and must-visit places, each with a short description",
+            "The best neighborhoods to stay in, with pros and cons",
+            "Local culture, customs and etiquette",
+            "Getting around, estimated costs per spending level, seasons and the best time to visit",
+            "Safety and health tips, local cuisine and must-try dishes",
+        ),
+        details=(
+            "Cover a broad range of interests, the guide is personalized for each trip later",
+            "Check that facts are accurate and current, skip advice that fits any destination",
+        ),
+        trip="Destination: {destination}",
+    ),
+    PromptTemplate(
+        name="destination_knowledge",
+        instructions="Verify the destination guide provided as context and write its final version. Check:",
+        checklist=(
+            "Factual accuracy and completeness against the research brief",
+            "Quality and usefulness of the recommendations, formatting and structure",
+            "Critical information about the destination that is missing",
+        ),
+        details=("Fix errors, add what is missing and improve the structure",),
+        category="destination_guide",
+        trip="Destination: {destination}",
+    ),
+    PromptTemplate(
+        name="destination_guide",
+        instructions=(
+            "Personalize the destination guide for the trip below: keep its facts and structure, lead with what\n"
+            "matches the preferences, add notes on the season, budget, children and special requirements and\n"
+            "shorten the rest. No new research, return the complete guide."
+        ),
+        trip=(
+            "Destination: {destination}\n"
+            "Travelers: {adults} adults and {children} children\n"
+            "Preferences: {preferences}\n"
+            "Budget level: {budget}\n"
+            "Travel dates: {outbound_date} to {return_date}\n"
+            "Special requirements: {special_requirements}\n"
+            "Base your work on {guide_source}"
+        ),
+    ),
+    PromptTemplate(
+        name="flight_research",
+        instructions=(
+            "Find the best flight options for the trip below with the flight search tool. The plan shows every\n"
+            "option the tool returns as a table, so don't repeat it; write a short commentary on those options:"
+        ),
+        checklist=(
+            "The best value option and why: convenient times, few and short layovers, airline comfort",
+            "The cheapest and the fastest option when they differ from it, with the trade-off",
+            "Red-eye flights and long layovers to avoid",
+        ),
+        details=("Total price for all travelers of the recommended option",),
+        trip=(
+            "Route: {departure_airport} to {arrival_airport}\n"
+            "Outbound: {outbound_date}\n"
+            "Return: {return_date}\n"
+            "Travelers: {num_travelers}\n"
+            "{notes}"
+        ),
+    ),
+    PromptTemplate(
+        name="hotel_research",
+        instructions=(
+            "Find the best hotel options for the stay below with the hotel search tool. The plan shows every\n"
+            "hotel the tool returns as a table, so don't repeat it; pick the 3 that suit the travelers best\n"
+            "and give each a heading with:"
+        ),
+        checklist=(
+            "Why it suits this party and budget level",
+            "Its location and what is nearby",
+            "Pros and cons worth knowing before booking",
+        ),
+        details=(
+            "Which one addresses the special requirements, and child-friendly facilities for children",
+            "Which one is the best overall value",
+        ),
+        trip=(
+            "City: {hotel_city}\n"
+            "Check-in: {outbound_date}\n"
+            "Check-out: {return_date}\n"
+            "Rooms: {rooms}, adults: {adults}, children: {children}\n"
+            "Hotel class: {hotel_class} stars\n"
+            "Budget level: {budget}\n"
+            "Special requirements: {special_requirements}"
+        ),
+    ),
+    PromptTemplate(
+        name="itinerary_research",
+        instructions=(
+            "Create a detailed day-by-day travel itinerary for the trip below, one heading per day, with:"
+        ),
+        checklist=(
+            "Timed activities at named attractions with addresses or meeting points",
+            "Estimated costs of every activity and meal",
+            "Transport between stops with options and travel times",
+            "A restaurant for each meal with cuisine and price range",
+            "Rest periods, more of them when children travel",
+            "Alternatives for bad weather or closures",
+        ),
+        details=(
+            "Something for every stated preference each day, within the budget level",
+            "Attractions open on their scheduled days and realistic travel times, don't overpack the days",
+            "Etiquette tips for the places visited",
+        ),
+        trip=(
+            "Length: {days}-day trip to {destination}\n"
+            "Travel dates: {outbound_date} to {return_date}\n"
+            "Travelers: {adults} adults and {children} children\n"
+            "Preferences: {preferences}\n"
+            "Budget level: {budget}\n"
+            "Special requirements: {special_requirements}"
+        ),
+    ),
+    PromptTemplate(
+        name="itinerary_prose",
+        instructions=(
+            "Create a detailed day-by-day travel itinerary from the fixed schedule provided as context. Keep\n"
+            "every day heading, time, place and cost of the schedule, don't add, drop or move stops. Add:"
+        ),
+        checklist=(
+            "Two or three sentences on what to see and do at each stop",
+            "How to get to each stop from the previous one",
+            "A restaurant for each meal with cuisine and price range",
+        ),
+        details=(
+            "Etiquette tips where they matter",
+            "The schedule's alternatives for bad weather or closures at the end",
+        ),
+        trip=(
+            "Length: {days}-day trip to {destination}\n"
+            "Travelers: {adults} adults and {children} children\n"
+            "Preferences: {preferences}\n"
+            "Budget level: {budget}\n"
+            "Special requirements: {special_requirements}"
+        ),
+    ),
+    PromptTemplate(
+        name="flight_options",
+        instructions="Verify the flight options provided as context and write their final version. Check:",
+        checklist=(
+            "Every flight it names matches the search results it was written from, no invented options",
+            "Suitability for the number of travelers and a clearly marked best value",
+        ),
+        details=("Fix unrealistic details and keep it a short commentary, the options are shown as a table",),
+        category="flight_options",
+        trip=(
+            "Route: {departure_airport} to {arrival_airport}\n"
+            "Travelers: {num_travelers}"
+        ),
+    ),
+    PromptTemplate(
+        name="hotel_recommendations",
+        instructions="Verify the hotel recommendations provided as context and write their final version. Check:",
+        checklist=(
+            "Every hotel it names matches the search results it was written from, no invented hotels",
+            "Rooms for all travelers, the requested star standard and prices within the budget level",
+            "The special requirements are addressed",
+        ),
+        details=("Correct outdated details and keep it to the picks, the hotels are shown as a table",),
+        category="hotel_recommendations",
+        trip=(
+            "City: {hotel_city}\n"
+            "Travelers: {adults} adults and {children} children\n"
+            "Hotel class: {hotel_class} stars\n"
+            "Budget level: {budget}\n"
+            "Special requirements: {special_requirements}"
+        ),
+    ),
+    PromptTemplate(
+        name="itinerary_recommendations",
+        instructions="Verify the day-by-day itinerary provided as context and write its final version. Check:",
+        checklist=(
+            "Logical flow, realistic timing and travel times between activities",
+            "Opening hours and availability of the attractions",
+            "Balance of the stated preferences, the budget level and the special requirements",
+            "Child-friendly pace and contingency plans",
+        ),
+        details=("Keep one heading per day and add details that make the plan usable",),
+        category="itinerary_recommendations",
+        trip=(
+            "Length: {days}-day trip to {destination}\n"
+            "Travelers: {adults} adults and {children} children\n"
+            "Preferences: {preferences}\n"
+            "Budget level: {budget}\n"
+            "Special requirements: {special_requirements}"
+        ),
+    ),
+    PromptTemplate(
+        name="verification_batch",
+        instructions=(
+            "Verify the travel documents provided as context, each starts with a line === name ===. Check facts,\n"
+            "completeness, realistic prices and timings, fix what is wrong and remove everything outside the\n"
+            "document's scope:"
+        ),
+        trip=(
+            "{scopes}\n\n"
+            "Documents: {names}\n"
+            "Travelers: {adults} adults and {children} children\n"
+            "Return every document, corrected, under the same === name === line and in the same order,\n"
+            "with nothing before, between or after them."
+        ),
+    ),
+)}
+
+
+def render(name: str, **values) -> RenderedPrompt:
+    return TEMPLATES[name].render(**values)
+
+
+def batch_scopes(documents: Dict[str, str]) -> str:
+    """Scope lines of the batch verification, ``documents`` maps a document name to its category"""
+    return "\n".join(f"- {name}: {CATEGORY_SCOPES[category][1]}" for name, category in documents.items())
+
+
+def measure_descriptions(descriptions: Dict[str, str], **values) -> Dict[str, int]:
+    """Estimated tokens of hand written task descriptions, formatted with a trip's values"""
+    return {name: estimate_tokens(text.format(**values)) for name, text in descriptions.items()}
+
+
+def prompt_report(prompts: Dict[str, RenderedPrompt], spans,
+                  baseline: Optional[Dict[str, int]] = None) -> Dict[str, object]:
+    """Tokens of each task's description and of the LLM calls made for the task.
+
+    ``sent_tokens`` are the prompt tokens the calls under the task's span
+    actually sent: the description plus the system message, the context and
+    the agent's scratchpad. With the ``baseline`` tokens of the descriptions
+    the templates replaced (see ``measure_descriptions``), the report adds the
+    tokens saved, once per LLM call since a task resends its description on
+    every call.
+    """
+    task_spans = {span.span_id: span.name for span in spans if span.kind == "task"}
+    calls: Dict[str, int] = {}
+    sent: Dict[str, int] = {}
+    for span in spans:
+        if span.kind == "llm" and span.parent_id in task_spans:
+            name = task_spans[span.parent_id]
+            calls[name] = calls.get(name, 0) + 1
+            sent[name] = sent.get(name, 0) + span.attributes.get("prompt_tokens", 0)
+
+    rows: List[Dict[str, object]] = []
+    for name, prompt in prompts.items():
+        row = {
+            "task": name,
+            "description_tokens": prompt.tokens,
+            "budget": prompt.budget,
+            "llm_calls": calls.get(name, 0),
+            "sent_tokens": sent.get(name, 0),
+            "dropped_details": prompt.dropped_details,
+        }
+        if baseline is not None and name in baseline:
+            row["baseline_tokens"] = baseline[name]
+            row["tokens_saved"] = (baseline[name] - prompt.tokens) * calls.get(name, 0)
+        rows.append(row)
+    report = {
+        "tasks": rows,
+        "description_tokens": sum(row["description_tokens"] * row["llm_calls"] for row in rows),
+        "sent_tokens": sum(row["sent_tokens"] for row in rows),
+    }
+    if baseline is not None:
+        report["tokens_saved"] = sum(row.get("tokens_saved", 0) for row in rows)
+    return report
@@ -0,0 +1,162 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from dataclasses import dataclass, field
+from time import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from tools.tracing import span
+
+
+@dataclass
+class TaskEvent:
+    """Progress notification emitted while a TaskGraph runs.
+
+    ``kind`` is one of ``task_started``, ``tool_call``, ``token``,
+    ``search_results``, ``task_finished`` or ``task_failed``; ``payload``
+    carries the tool call, streamed text, ``(kind, options)`` of a search
+    tool, output or error.
+    """
+    kind: str
+    task: str
+    payload: Any = None
+    timestamp: float = field(default_factory=time)
+
+
+# (graph, task name) of the node running on the current worker thread
+_current_task: ContextVar = ContextVar("current_task", default=None)
+
+
+def emit_current(kind: str, payload: Any = None):
+    """Report an event for the task running on this thread; a no-op outside of a TaskGraph.
+
+    Lets code deep inside a task, such as LLM callbacks or tools, surface
+    progress without being handed the graph explicitly.
+    """
+    current = _current_task.get()
+    if current:
+        graph, name = current
+        graph.emit(kind, name, payload)
+
+
+class TaskGraph:
+    """Dependency-aware scheduler for a small DAG of crew tasks.
+
+    Every node is started as soon as all of its dependencies have finished,
+    so independent chains run concurrently and the total wall time is bounded
+    by the longest chain instead of the sum of all nodes.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._deps: Dict[str, tuple] = {}
+        self._events: Optional[queue.Queue] = None
+
+    def add(self, name: str, fn: Callable[[Dict[str, Any]], Any], depends_on: Iterable[str] = ()):
+        """Register ``fn`` under ``name``; it is called with the outputs of ``depends_on``."""
+        if name in self._nodes:
+            raise ValueError(f"Task '{name}' is already part of the graph")
+        self._nodes[name] = fn
+        self._deps[name] = tuple(depends_on)
+        return self
+
+    def __contains__(self, name):
+        return name in self._nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def emit(self, kind: str, task: str, payload: Any = None):
+        """Report an event from a worker thread; listeners see it on the thread that called ``run``."""
+        if self._events is not None:
+            self._events.put(TaskEvent(kind, task, payload))
+
+    def _check(self):
+        for name, deps in self._deps.items():
+            for dep in deps:
+                if dep not in self._nodes:
+                    raise ValueError(f"Task '{name}' depends on unknown task '{dep}'")
+
+        # Kahn's algorithm, only to reject cycles before anything is started
+        indegree = {name: len(deps) for name, deps in self._deps.items()}
+        ready = [name for name, count in indegree.items() if count == 0]
+        seen = 0
+        while ready:
+            current = ready.pop()
+            seen += 1
+            for name, deps in self._deps.items():
+                if current in deps:
+                    indegree[name] -= 1
+                    if indegree[name] == 0:
+                        ready.append(name)
+        if seen != len(self._nodes):
+            raise ValueError("Task graph contains a dependency cycle")
+
+    def _execute(self, name, context):
+        token = _current_task.set((self, name))
+        try:
+            self.emit("task_started", name)
+            with span(name, "task"):
+                return self._nodes[name](context)
+        finally:
+            _current_task.reset(token)
+
+    def run(self, max_workers: Optional[int] = None, listener: Optional[Callable[[TaskEvent], None]] = None):
+        """Execute the graph and return ``(outputs, errors)`` keyed by task name.
+
+        A failing task does not abort the run: its dependents are skipped and
+        reported in ``errors`` while unrelated chains keep going. ``listener``
+        is called with every TaskEvent on the calling thread, so it may safely
+        update UI elements that are bound to that thread.
+        """
+        self._check()
+        outputs: Dict[str, Any] = {}
+        errors: Dict[str, BaseException] = {}
+        pending = dict(self._deps)
+        running = 0
+        self._events = events = queue.Queue()
+
+        def finished(name):
+            return lambda future: events.put(TaskEvent("_done", name, future))
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers or len(self._nodes) or 1,
+                                    thread_name_prefix="crew-task") as pool:
+                while pending or running:
+                    for name, deps in list(pending.items()):
+                        failed = [dep for dep in deps if dep in errors]
+                        if failed:
+                            errors[name] = RuntimeError(f"Skipped because '{failed[0]}' failed")
+                            del pending[name]
+                            if listener:
+                                listener(TaskEvent("task_failed", name, errors[name]))
+                        elif all(dep in outputs for dep in deps):
+                            context = {dep: outputs[dep] for dep in deps}
+                            # Each node runs in a copy of the caller's context, so it joins the caller's trace
+                            pool.submit(copy_context().run, self._execute, name, context) \
+                                .add_done_callback(finished(name))
+                            running += 1
+                            del pending[name]
+
+                    if not running:
+                        continue
+
+                    event = events.get()
+                    if event.kind == "_done":
+                        running -= 1
+                        try:
+                            outputs[event.task] = event.payload.result()
+                            event = TaskEvent("task_finished", event.task, outputs[event.task])
+                        except Exception as e:
+                            errors[event.task] = e
+                            event = TaskEvent("task_failed", event.task, e)
+                    if listener:
+                        listener(event)
+
+            # Events emitted right before the last task completed
+            while listener and not events.empty():
+                listener(events.get())
+        finally:
+            self._events = None
+
+        return outputs, errors
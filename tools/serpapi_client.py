@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from tools.tracing import Span, span
+
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search.json")
+SERPAPI_TIMEOUT_SECONDS = float(os.getenv("SERPAPI_TIMEOUT_SECONDS", 30))
+SERPAPI_MAX_CONCURRENCY = int(os.getenv("SERPAPI_MAX_CONCURRENCY", 8))
+SERPAPI_MAX_RETRIES = int(os.getenv("SERPAPI_MAX_RETRIES", 3))
+SERPAPI_BACKOFF_SECONDS = float(os.getenv("SERPAPI_BACKOFF_SECONDS", 0.5))
+
+# Rate limiting and server side hiccups are worth another try, bad requests are not
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class SerpApiError(Exception):
+    """SerpAPI answered, but with an error instead of results"""
+
+
+class SerpApiClient:
+    """Shared SerpAPI client for the finder tools.
+
+    Requests go through one ``httpx.AsyncClient`` whose keep-alive pool is
+    reused by every search. The client lives on its own event loop thread, so
+    the synchronous crewai tools can call ``search`` from any worker thread
+    while searches from parallel agents overlap on the wire. At most
+    ``max_concurrency`` requests are in flight; transport errors and
+    retryable status codes are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, base_url: str = SERPAPI_URL, timeout: float = SERPAPI_TIMEOUT_SECONDS,
+                 max_concurrency: int = SERPAPI_MAX_CONCURRENCY, max_retries: int = SERPAPI_MAX_RETRIES,
+                 backoff: float = SERPAPI_BACKOFF_SECONDS):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="serpapi-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _session(self):
+        # Only called on the client's loop, where the pool and semaphore are bound
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client, self._semaphore
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter, so concurrent searches that failed together don't retry together
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    async def asearch(self, params: Dict[str, Any], trace: Optional[Span] = None) -> Dict[str, Any]:
+        """Run one search on the client's loop and return the decoded response.
+
+        ``trace`` is the caller's span; the loop thread doesn't share the caller's context.
+        """
+        client, semaphore = self._session()
+        # Optional tool arguments arrive as None; SerpAPI expects them to be left out
+        params = {name: value for name, value in params.items() if value is not None}
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    self.requests += 1
+                    response = await client.get(self.base_url, params=params)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+                problem = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                problem = repr(e)
+            if attempt >= self.max_retries:
+                raise SerpApiError(f"SerpAPI request failed after {attempt + 1} attempts: {problem}")
+            self.retries += 1
+            if trace is not None:
+                trace.add("retries")
+            logging.info(f"Retrying SerpAPI {params.get('engine')} search after {problem}")
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+        try:
+            data = response.json()
+        except ValueError:
+            raise SerpApiError(f"SerpAPI returned HTTP {response.status_code} without a JSON body")
+        if response.status_code >= 400 or data.get("error"):
+            raise SerpApiError(data.get("error") or f"SerpAPI returned HTTP {response.status_code}")
+        return data
+
+    def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Blocking search for tool threads; waits only for this request, never the whole pool"""
+        with span(f"serpapi {params.get('engine')}", "http") as trace:
+            future = asyncio.run_coroutine_threadsafe(self.asearch(params, trace), self._ensure_loop())
+            return future.result()
+
+    def search_many(self, params_list: Iterable[Dict[str, Any]]) -> List[Any]:
+        """Run several searches concurrently; each result is the response or the exception it raised"""
+        params_list = list(params_list)
+        with span("serpapi batch", "http", searches=len(params_list)) as trace:
+            async def gather():
+                return await asyncio.gather(*(self.asearch(params, trace) for params in params_list),
+                                            return_exceptions=True)
+            return asyncio.run_coroutine_threadsafe(gather(), self._ensure_loop()).result()
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "retries": self.retries}
+
+
+_client: Optional[SerpApiClient] = None
+_client_lock = threading.Lock()
+
+
+def get_serpapi_client() -> SerpApiClient:
+    """The process wide client both finder tools share"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SerpApiClient()
+        return _client
@@ -0,0 +1,82 @@
+import functools
+import json
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from tools.cache import cache_key
+from tools.tracing import span
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent identical requests into one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in
+    flight wait for it and get the same result, or the same exception. Once
+    it has finished the key is forgotten, so later calls run again (caching
+    finished results is the job of the TTL caches).
+    """
+
+    def __init__(self):
+        self.executions = 0
+        self.shared = 0
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return ``(result, shared)``; ``shared`` is True when another caller's execution was reused"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {"executions": self.executions, "shared": self.shared}
+
+
+# Tool calls of every agent in the process go through this one
+tool_calls = SingleFlight()
+
+
+def coalesced(run):
+    """Decorator for a tool's ``_run``: identical concurrent calls of the same tool share one execution"""
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        key = cache_key({"tool": type(self).__name__, "args": args, "kwargs": kwargs})
+        with span(f"tool {self.name}", "tool", input=json.dumps(kwargs, default=str)[:300]) as trace:
+            result, shared = tool_calls.do(key, lambda: run(self, *args, **kwargs))
+            if trace is not None:
+                trace.attributes["coalesced"] = shared
+            return result
+    return wrapper
@@ -0,0 +1,114 @@
+import threading
+
+from crewai.events import (LLMCallCompletedEvent, LLMCallFailedEvent, LLMCallStartedEvent,
+                           LLMStreamChunkEvent, ToolUsageStartedEvent, crewai_event_bus)
+
+from tools.compact import estimate_tokens
+from tools.scheduler import emit_current
+from tools.tracing import current_span, start_span
+
+
+class TaskTokenStream:
+    """Forward streamed LLM chunks as ``token`` events of the task running on this thread.
+
+    crewai publishes every chunk on its event bus, synchronously on the thread
+    making the call and so inside the context TaskGraph gave the task; routing
+    by the current task keeps concurrent tasks and sessions apart.
+    """
+
+    def on_chunk(self, source, event: LLMStreamChunkEvent):
+        # Chunks of native tool call arguments are not part of the answer
+        if event.chunk and event.tool_call is None:
+            emit_current("token", event.chunk)
+
+
+class TaskToolCalls:
+    """Forward the tools an agent starts as ``tool_call`` events of its task.
+
+    Agents of a function calling LLM run tools in crewai's native loop, which
+    never reaches ``step_callback``; the bus event is published on both paths.
+    """
+
+    def on_started(self, source, event: ToolUsageStartedEvent):
+        emit_current("tool_call", {"tool": event.tool_name, "input": str(event.tool_args or "")[:500]})
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install_llm_listeners():
+    """Subscribe the handlers to crewai's process wide event bus, once"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        crewai_event_bus.on(LLMStreamChunkEvent)(TaskTokenStream().on_chunk)
+        crewai_event_bus.on(ToolUsageStartedEvent)(TaskToolCalls().on_started)
+        spans = LLMSpans()
+        crewai_event_bus.on(LLMCallStartedEvent)(spans.on_started)
+        for ended in (LLMCallCompletedEvent, LLMCallFailedEvent):
+            crewai_event_bus.on(ended)(spans.on_ended)
+        _installed = True
+
+
+def flush_llm_events(timeout: float = 5.0):
+    """Wait for queued event handlers, so the LLM spans of a finished run are complete"""
+    crewai_event_bus.flush(timeout)
+
+
+class LLMSpans:
+    """Trace every LLM call as a span of the task that made it, with its token counts.
+
+    crewai runs these handlers on its own pool with a copy of the caller's
+    context, so the current span is still the task's, but a call's start and
+    end may be handled in either order; whichever comes second closes the
+    span. Times are the events' own timestamps. Without usage data in the
+    response, tokens are estimated from the text (``tokens_estimated``).
+    """
+
+    def __init__(self):
+        self._started = {}
+        self._ended = {}
+        self._lock = threading.Lock()
+
+    def on_started(self, source, event: LLMCallStartedEvent):
+        if current_span() is None:
+            return
+        llm_span = start_span(f"llm {event.model}", "llm", model=event.model or "",
+                              prompt_tokens=estimate_tokens(message_text(event.messages)), tokens_estimated=True)
+        llm_span.start = event.timestamp.timestamp()
+        with self._lock:
+            ended = self._ended.pop(event.call_id, None)
+            if ended is None:
+                self._started[event.call_id] = llm_span
+        if ended is not None:
+            self._finish(llm_span, ended)
+
+    def on_ended(self, source, event):
+        if current_span() is None:
+            return
+        with self._lock:
+            llm_span = self._started.pop(event.call_id, None)
+            if llm_span is None:
+                self._ended[event.call_id] = event
+        if llm_span is not None:
+            self._finish(llm_span, event)
+
+    @staticmethod
+    def _finish(llm_span, event):
+        if isinstance(event, LLMCallFailedEvent):
+            llm_span.status = f"error: {event.error[:200]}"
+        elif event.usage:
+            llm_span.attributes.update(prompt_tokens=event.usage.get("prompt_tokens", 0),
+                                       completion_tokens=event.usage.get("completion_tokens", 0),
+                                       tokens_estimated=False)
+        else:
+            llm_span.attributes["completion_tokens"] = estimate_tokens(str(event.response or ""))
+        llm_span.end = event.timestamp.timestamp()
+
+
+def message_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(message.get("content") or "") for message in messages or [])
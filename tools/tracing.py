@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Directory a JSONL trace is written to after every plan run; tracing to disk is off when unset
+TRACE_DIR = os.getenv("TRAVEL_TRACE_DIR")
+
+
+@dataclass(slots=True)
+class Span:
+    """One timed operation of a run: the run itself, a task, an LLM call, a tool call or a search"""
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: str
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    events: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def add(self, name: str, amount=1):
+        """Add to a numeric attribute, e.g. tokens or cache hits"""
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def event(self, name: str, **attributes):
+        self.events.append({"name": name, "timestamp": time.time(), "attributes": attributes})
+
+
+# (tracer, span) the code on this thread is running in
+_current: ContextVar = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Collects the spans of one plan run.
+
+    Spans nest through a context variable: whatever starts while a span is
+    current becomes its child. TaskGraph copies the context into its worker
+    threads, so task, LLM and tool spans end up in the tree of their run.
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, kind: str, parent: Optional[Span] = None, **attributes) -> Span:
+        span = Span(self.trace_id, uuid.uuid4().hex[:16], parent.span_id if parent else None,
+                    name, kind, time.time(), attributes=attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def activate(self, name: str, kind: str = "run", **attributes):
+        """Root span of the run; everything traced inside it, on any task thread, joins this trace"""
+        span = self.start_span(name, kind, **attributes)
+        token = _current.set((self, span))
+        try:
+            yield span
+        except BaseException as e:
+            span.status = f"error: {type(e).__name__}"
+            raise
+        finally:
+            span.end = time.time()
+            _current.reset(token)
+
+    def to_jsonl(self) -> str:
+        return "\n".join(json.dumps(asdict(span), default=str) for span in self.spans)
+
+    def to_otel(self) -> Dict[str, Any]:
+        """The trace in the OTLP/JSON layout, for collectors and trace viewers"""
+        def value(item):
+            if isinstance(item, bool):
+                return {"boolValue": item}
+            if isinstance(item, int):
+                return {"intValue": str(item)}
+            if isinstance(item, float):
+                return {"doubleValue": item}
+            return {"stringValue": str(item)}
+
+        def nanos(seconds):
+            return str(int(seconds * 1e9)) if seconds else "0"
+
+        spans = [{
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "kind": "SPAN_KIND_CLIENT" if span.kind in ("llm", "tool", "http") else "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": nanos(span.start),
+            "endTimeUnixNano": nanos(span.end),
+            "attributes": [{"key": key, "value": value(item)}
+                           for key, item in {"span.kind": span.kind, **span.attributes}.items()],
+            "events": [{"name": event["name"], "timeUnixNano": nanos(event["timestamp"]),
+                        "attributes": [{"key": key, "value": value(item)} for key, item in event["attributes"].items()]}
+                       for event in span.events],
+            "status": {"code": "STATUS_CODE_OK" if span.status == "ok" else "STATUS_CODE_ERROR",
+                       "message": "" if span.status == "ok" else span.status},
+        } for span in self.spans]
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "travel-planner"}}]},
+            "scopeSpans": [{"scope": {"name": "tools.tracing"}, "spans": spans}],
+        }]}
+
+    def export(self, directory: str = TRACE_DIR) -> Optional[str]:
+        """Write the trace as ``<trace id>.jsonl`` into ``directory`` and return the path"""
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.trace_id}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_jsonl() + "\n")
+        return path
+
+
+def current_span() -> Optional[Span]:
+    current = _current.get()
+    return current[1] if current else None
+
+
+@contextmanager
+def span(name: str, kind: str, **attributes):
+    """Trace a block as a child of the current span; yields None outside of a traced run"""
+    current = _current.get()
+    if current is None:
+        yield None
+        return
+    tracer, parent = current
+    child = tracer.start_span(name, kind, parent, **attributes)
+    token = _current.set((tracer, child))
+    try:
+        yield child
+    except BaseException as e:
+        child.status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        child.end = time.time()
+        _current.reset(token)
+
+
+def start_span(name: str, kind: str, **attributes) -> Optional[Span]:
+    """Child of the current span that the caller ends itself, for callbacks that can't wrap a block"""
+    current = _current.get()
+    if current is None:
+        return None
+    tracer, parent = current
+    return tracer.start_span(name, kind, parent, **attributes)
+
+
+def record(name: str, amount=1):
+    """Count something, such as a cache hit, on the current span; a no-op outside of a traced run"""
+    current = current_span()
+    if current is not None:
+        current.add(name, amount)
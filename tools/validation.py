@@ -0,0 +1,81 @@
+import re
+from typing import List, Optional
+
+# Phrases that only belong in one kind of document. A document that uses
+# several phrases of another category has picked up content it shouldn't have.
+CATEGORY_KEYWORDS = {
+    "destination_guide": (
+        "must-try dishes", "local customs", "etiquette", "best time to visit", "neighborhoods",
+        "safety tips",
+    ),
+    "flight_options": (
+        "layover", "flight number", "departure time", "arrival time", "baggage allowance",
+        "red-eye", "non-stop", "nonstop", "economy class",
+    ),
+    "hotel_recommendations": (
+        "check-in", "check-out", "per night", "room type", "guest rating", "star hotel",
+        "free cancellation", "breakfast included",
+    ),
+    "itinerary_recommendations": (
+        "day 1", "day 2", "day 3", "morning:", "afternoon:", "evening:", "itinerary",
+    ),
+}
+
+# A category is only considered leaked once this many distinct phrases show up
+LEAKAGE_THRESHOLD = 3
+
+AGENT_SCAFFOLDING = re.compile(r"^\s*(Thought|Action|Action Input|Observation):", re.MULTILINE)
+HEADING = re.compile(r"^#{1,4}\s+\S", re.MULTILINE)
+DAY_HEADING = re.compile(r"^#{1,4}.*\bday\s*\d+", re.MULTILINE | re.IGNORECASE)
+
+MIN_LENGTH = 400
+MIN_HEADINGS = {
+    "destination_guide": 4,
+    "flight_options": 1,
+    "hotel_recommendations": 3,
+    "itinerary_recommendations": 2,
+}
+
+
+def leaked_categories(category: str, text: str) -> List[str]:
+    """Other categories whose vocabulary shows up at least LEAKAGE_THRESHOLD times in ``text``"""
+    lowered = text.lower()
+    leaked = []
+    for other, keywords in CATEGORY_KEYWORDS.items():
+        if other == category:
+            continue
+        if sum(1 for keyword in keywords if keyword in lowered) >= LEAKAGE_THRESHOLD:
+            leaked.append(other)
+    return leaked
+
+
+def validate_document(category: str, text: str, days: Optional[int] = None) -> List[str]:
+    """Deterministic checks of a research draft; returns the issues found, empty when it passes.
+
+    Covers what the verification prompts mostly enforce: a real Markdown
+    document with headings, no agent scaffolding or code fences, the
+    structure each category needs, and no content of other categories.
+    """
+    issues = []
+    text = text or ""
+    if len(text.strip()) < MIN_LENGTH:
+        issues.append(f"the document is too short ({len(text.strip())} characters)")
+    if "```" in text:
+        issues.append("it contains markdown code block fences")
+    if AGENT_SCAFFOLDING.search(text):
+        issues.append("it contains agent reasoning (Thought/Action lines)")
+    if "placeholder content" in text.lower():
+        issues.append("it still contains placeholder text")
+
+    headings = len(HEADING.findall(text))
+    if headings < MIN_HEADINGS.get(category, 1):
+        issues.append(f"it has {headings} Markdown headings, expected at least {MIN_HEADINGS.get(category, 1)}")
+
+    if category == "itinerary_recommendations" and days:
+        day_headings = len(set(re.findall(r"day\s*(\d+)", " ".join(DAY_HEADING.findall(text)), re.IGNORECASE)))
+        if day_headings < days:
+            issues.append(f"it has headings for {day_headings} days, the trip has {days}")
+
+    for other in leaked_categories(category, text):
+        issues.append(f"it contains {other.replace('_', ' ')} content")
+    return issues
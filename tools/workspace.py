@@ -0,0 +1,59 @@
+import os
+import shutil
+import time
+import uuid
+
+# Kept relative to the working directory: crewai strips the leading slash from
+# absolute Task.output_file paths. Run directories older than the TTL are
+# removed by the next run that starts.
+RUNS_DIR = os.getenv("TRAVEL_RUNS_DIR", "temp_outputs")
+RUN_TTL_SECONDS = int(os.getenv("TRAVEL_RUN_TTL_SECONDS", 6 * 60 * 60))
+
+
+class RunWorkspace:
+    """Private output directory for one TravelPlanningCrew run.
+
+    Every run writes into ``<root>/<run_id>/`` so concurrent sessions in the
+    same process never read, overwrite or delete each other's files.
+    Creating a workspace also sweeps directories left behind by runs that
+    are older than ``ttl`` seconds.
+    """
+
+    def __init__(self, root: str = RUNS_DIR, ttl: int = RUN_TTL_SECONDS):
+        self.root = root
+        self.ttl = ttl
+        self.run_id = uuid.uuid4().hex
+        self.path = os.path.join(root, self.run_id)
+        os.makedirs(self.path)
+        sweep_expired_workspaces(root, ttl, keep=self.run_id)
+
+    def file(self, name: str) -> str:
+        """Absolute path of ``name`` inside this run's directory"""
+        return os.path.join(self.path, name)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+def sweep_expired_workspaces(root: str = RUNS_DIR, ttl: int = RUN_TTL_SECONDS, keep: str = None):
+    """Remove run directories under ``root`` that were last modified more than ``ttl`` seconds ago"""
+    cutoff = time.time() - ttl
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name == keep or not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            # Another session swept it first
+            continue